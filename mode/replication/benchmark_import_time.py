@@ -0,0 +1,36 @@
+import sys
+import time
+import argparse
+import subprocess
+
+MODULES = ['src.SyntheticData', 'src.DoublyRobustEstimator', 'src.BootstrapEstimator',
+           'src.EqualizedOddsPostProcesser', 'src.SupervisedLearningModel', 'src.ReplicationExperiment',
+           'src.FairnessMetricVisualizer', 'src.EqualizedOddsPostProcessingAnalysis']
+HEAVY = ['pandas', 'matplotlib', 'sklearn', 'fairlearn', 'scipy', 'cvxpy']
+
+## Times `python -c "import <module>"` in fresh interpreters (best of --repeat,
+## interpreter startup included) and lists the heavy packages each import pulls in
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", help="modules to import", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", help="fresh interpreters per module", type=int, default=5)
+    parser.add_argument("--budget", help="milliseconds allowed for src.DoublyRobustEstimator", type=float, default=200)
+    args = parser.parse_args()
+
+    report = f"import sys; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    timings = {}
+    for module in args.modules:
+        elapsed = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+            elapsed.append(time.perf_counter() - start)
+        loaded = subprocess.run([sys.executable, "-c", f"import {module}; {report}"],
+                                check=True, capture_output=True, text=True).stdout.strip()
+        timings[module] = min(elapsed) * 1e3
+        print(f"{module:45s} {timings[module]:7.1f} ms   {loaded or '-'}")
+
+    if 'src.DoublyRobustEstimator' in timings and timings['src.DoublyRobustEstimator'] > args.budget:
+        sys.exit(f"src.DoublyRobustEstimator imports in {timings['src.DoublyRobustEstimator']:.1f} ms "
+                 f"(budget {args.budget:.0f} ms)")
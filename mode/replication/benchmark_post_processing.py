@@ -0,0 +1,40 @@
+import time
+import argparse
+import numpy as np
+
+from src.EqualizedOddsPostProcesser import EqualizedOddsPostProcesser
+from src.EqualizedOddsStreamingPostProcesser import EqualizedOddsStreamingPostProcesser
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-points", help="records per batch", type=int, default=10**6)
+    parser.add_argument("--num-records", help="records timed one at a time", type=int, default=10**5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    scores = rng.random(args.num_points)
+    groups = rng.integers(0, 2, args.num_points)
+    mix_rates = np.array([[0.8, 0.2], [0.6, 0.1]])
+    config = {'target': {'observational': 'Y'}, 'features': {'sensitive': 'A'}}
+
+    batch = EqualizedOddsPostProcesser(config)
+    online = EqualizedOddsStreamingPostProcesser(mix_rates)
+
+    latencies = np.empty(args.num_records)
+    for i, (score, group) in enumerate(zip(scores[:args.num_records].tolist(), groups[:args.num_records].tolist())):
+        start = time.perf_counter()
+        online.transform_one(score, group)
+        latencies[i] = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    print(f"transform_one: p50 {p50:.2f} us, p99 {p99:.2f} us")
+
+    for name, function in [('transform_batch', lambda: online.transform_batch(scores, groups)),
+                           ('batch transform', lambda: batch.transform(scores, groups, mix_rates))]:
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {args.num_points / elapsed / 1e6:.1f}M records/s")
+
+    print(f"flip rate (online / batch): {np.mean(online.transform_batch(scores, groups) != scores):.4f} / "
+          f"{np.mean(batch.transform(scores, groups, mix_rates) != scores):.4f}")
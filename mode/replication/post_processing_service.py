@@ -0,0 +1,14 @@
+import sys
+import argparse
+
+from src.EqualizedOddsStreamingPostProcesser import EqualizedOddsStreamingPostProcesser
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mix_rates", help="fitted mix rates saved by synthetic_experiments.py (.npy)")
+    parser.add_argument("--seed", help="random integer seed", default=0)
+    args = parser.parse_args()
+
+    service = EqualizedOddsStreamingPostProcesser.load(args.mix_rates, seed = int(args.seed))
+    service.serve(sys.stdin, sys.stdout)
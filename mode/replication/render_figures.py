@@ -0,0 +1,27 @@
+import argparse
+
+from src.ResultStore import ResultStore
+
+FIGURE_DIRECTORY = "./replication"
+FIGURES = {
+    'reweighing': 'fig',
+    'post_processed': 'fig_roc',
+    'roc': 'fig',
+    'precision_recall': 'fig',
+    'calibration': 'fig',
+}
+
+## Redraws figures from a store written by synthetic_experiments.py --store
+## without regenerating data or refitting any model
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("store", help="directory written by synthetic_experiments.py --store")
+    parser.add_argument("--figures", help="figures to draw", nargs="+", default=list(FIGURES), choices=list(FIGURES))
+    parser.add_argument("--workers", help="number of worker processes (default: one per CPU)", type=int, default=None)
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    for figure in args.figures:
+        save = FIGURE_DIRECTORY + "/" + figure + "/" + FIGURES[figure] + "_seed_{seed:03d}.png"
+        store.render(figure, save, max_workers = args.workers)
@@ -1,86 +1,61 @@
-import numpy as np
-import pandas as pd
 import argparse
 
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
+from src.ReplicationExperiment import ReplicationExperiment
 
-from src.SyntheticData import SyntheticData
-from src.SupervisedLearningModel import SupervisedLearningModel
-from src.ReweighingAnalysisVisualizer import ReweighingAnalysisVisualizer
-from src.MetricFrameGenerator import MetricFrameGenerator
-from src.EqualizedOddsPostProcesser import EqualizedOddsPostProcesser
-from src.EqualizedOddsPostProcessingAnalysis import EqualizedOddsPostProcessingAnalysis
-from src.FairnessMetricVisualizer import FairnessMetricVisualizer
+FIGURE_DIRECTORY = "./replication"
 
-if __name__ == '__main__':
+def run_seeds(seeds, max_workers = None, blas_threads = 1, render = False, **kwargs):
+    experiment = ReplicationExperiment(figure_directory = FIGURE_DIRECTORY, render = render, **kwargs)
+    return experiment.run_seeds(seeds, max_workers = max_workers, blas_threads = blas_threads)
 
-    FIGURE_DIRECTORY = "./replication"
+if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--seed", help="random integer seed", default=0)
+    parser.add_argument("--seeds", help="run every seed in [seed, seed + seeds) across a process pool", type=int, default=None)
+    parser.add_argument("--workers", help="number of worker processes (default: one per CPU)", type=int, default=None)
+    parser.add_argument("--blas-threads", help="BLAS/OpenMP threads per worker", type=int, default=1)
+    parser.add_argument("--no-render", help="skip drawing figures", action="store_true")
+    parser.add_argument("--model-cache", help="directory caching fitted nuisance models and their scores", default=None)
+    parser.add_argument("--cross-fit", help="number of folds for cross-fitted propensity and counterfactual scores", type=int, default=None)
+    parser.add_argument("--fold-workers", help="processes for the cross-fit folds and reweighing sweep of a single seed (default: one per CPU; 1 inside --seeds workers)", type=int, default=None)
+    parser.add_argument("--reweighing-cache", help="directory memoizing the reweighing sweep shared by all seeds (default: <store or data-store>/reweighing)", default=None)
+    parser.add_argument("--store", help="directory receiving every curve (.npz) and metric table (parquet)", default=None)
+    parser.add_argument("--data-store", help="directory of memory-mapped datasets, reused across runs (e.g. ./data)", default=None)
     args = parser.parse_args()
     seed = int(args.seed)
 
     c, k = 0.1, 1.6
     num_points = 100000
 
-    model_list = ['propensity', 'observational', 'counterfactual']
-
-    synthetic_data = SyntheticData(
-        treatment_effect = c, 
-        treatment_assignment_bias = k,
-        seed = seed)
-    df, config = synthetic_data.generate(num_points = num_points)
-
-    for model_key in model_list:
-        params = config.copy()
-        clf = LogisticRegression(penalty = 'none')
-        model = SupervisedLearningModel(model = clf, name = model_key, seed = seed)
-        if model_key == 'propensity':
-            params['target'] = params['treat']['name']
-        else:
-            params['target'] = params['outcome']['name']
-        model.fit(df, params)
-        train = df[params['features']['training']]
-        if model_key == 'propensity':
-            df[model_key] = clf.predict_proba(train)[:, 1:]
-        else:
-            df[model_key] = clf.predict_proba(train)[:, :1]
-
-    reweighing_analysis = ReweighingAnalysisVisualizer(config)
-    reweighing_analysis.visualize_base_rates(df, save = f"{FIGURE_DIRECTORY}/reweighing/fig_seed_{str(seed).zfill(3)}.png")
-
-    ## Postprocess test and training datasets via equalized odds
-    metric_frame =  MetricFrameGenerator()
-    equalized_odds = EqualizedOddsPostProcesser(config)
-    observational = config['target']['observational']
-    sensitive = config['features']['sensitive']
-    _df, postprocessed = df[df.columns.difference(['treat', 'outcome'], sort=False)], {}
-    datasets = train_test_split(_df, test_size=0.3, random_state=0)
-    for key, raw_data in zip(['train', 'test'], datasets):
-        data = raw_data.copy()
-        metricframe = metric_frame.generate(data[observational], data['counterfactual'], data[sensitive])
-        if key == 'train':
-            mix_rates = equalized_odds.mix_rates(data, metricframe)
-        probs = equalized_odds.post_process(data, metricframe, mix_rates)
-        for sensitive_class, prob in probs.items():
-            data.loc[data[sensitive] == sensitive_class, 'eo_fair_pred'] = prob
-        postprocessed[key] = data
-
-    eo_analysis = EqualizedOddsPostProcessingAnalysis(config)
-    _eo = eo_analysis.visualize_roc(postprocessed['test'], save = f"{FIGURE_DIRECTORY}/post_processed/fig_roc_seed_{str(seed).zfill(3)}.png")
-    errors = eo_analysis.error_analysis(postprocessed['test'])
-    errors = errors[['Group', 'Method', 'cGFPR', 'cGFNR', 'oGFPR', 'oGFNR']]
-    with open( f"{FIGURE_DIRECTORY}/post_processed/fig_roc_seed_{str(seed).zfill(3)}.tex", 'w') as f:
-        f.write(errors.to_latex(column_format='llrrrr', index=False))
-
-    test_df = postprocessed['test']
-    roc = FairnessMetricVisualizer(metric = 'roc', parameters = config)
-    _roc = roc.visualize_metric(test_df, save = f"{FIGURE_DIRECTORY}/roc/fig_seed_{str(seed).zfill(3)}.png")
-
-    precision_recall = FairnessMetricVisualizer(metric = 'precision_recall', parameters = config)
-    _pr = precision_recall.visualize_metric(test_df, save = f"{FIGURE_DIRECTORY}/precision_recall/fig_seed_{str(seed).zfill(3)}.png")
-
-    calibration = FairnessMetricVisualizer(metric = 'calibration', parameters = config)
-    _calibration = calibration.visualize_metric(test_df, save = f"{FIGURE_DIRECTORY}/calibration/fig_seed_{str(seed).zfill(3)}.png")
\ No newline at end of file
+    if args.seeds is None:
+        experiment = ReplicationExperiment(
+            treatment_effect = c,
+            treatment_assignment_bias = k,
+            num_points = num_points,
+            figure_directory = FIGURE_DIRECTORY,
+            render = not args.no_render,
+            model_cache = args.model_cache,
+            cross_fit = args.cross_fit,
+            inner_workers = args.fold_workers,
+            reweighing_cache = args.reweighing_cache,
+            store = args.store,
+            data_store = args.data_store)
+        experiment.run(seed)
+    else:
+        results, summary = run_seeds(
+            range(seed, seed + args.seeds),
+            max_workers = args.workers,
+            blas_threads = args.blas_threads,
+            render = not args.no_render,
+            model_cache = args.model_cache,
+            cross_fit = args.cross_fit,
+            inner_workers = args.fold_workers,
+            reweighing_cache = args.reweighing_cache,
+            store = args.store,
+            data_store = args.data_store,
+            treatment_effect = c,
+            treatment_assignment_bias = k,
+            num_points = num_points)
+        results.to_csv(f"{FIGURE_DIRECTORY}/results.csv", index=False)
+        summary.to_csv(f"{FIGURE_DIRECTORY}/summary.csv", index=False)
@@ -0,0 +1,181 @@
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from src.RandomStreams import RandomStreams
+from src.SharedFrame import SharedFrame
+from src.DoublyRobustEstimator import DoublyRobustEstimator
+
+class BootstrapEstimator(DoublyRobustEstimator):
+    # Percentile bootstrap bands for the doubly-robust curves and the
+    # generalized error table. Each replicate is a vector of resampling
+    # weights (Poisson(1) or multinomial counts); a batch of replicates is a
+    # (batch_size x n) weight matrix that is reduced against arrays prepared
+    # once per call, so no replicate ever rebuilds a frame.
+    def __init__(self, parameters, n_replicates = 1000, batch_size = 20, scheme = 'poisson',
+                 alpha = 0.05, seed = 0, max_workers = 1):
+        super().__init__(parameters = parameters)
+        self.n_replicates = n_replicates
+        self.batch_size = batch_size
+        self.scheme = scheme # 'poisson' or 'multinomial'
+        self.alpha = alpha
+        self.seed = seed
+        self.max_workers = max_workers
+        self.streams = RandomStreams(seed)
+        self.sensitive = self.parameters['features']['sensitive']
+        self.observational = self.parameters['target']['observational']
+        self.counterfactual = self.parameters['target']['counterfactual']
+
+    # {'fpr', 'tpr', 'precision', 'calibration', 'avg_score'}: (point, lower, upper)
+    def curves(self, df, method):
+        prepared = self._prepare_curves(df, method)
+        point = self._curve_kernel(np.ones((1, len(df))), prepared)
+        replicates = self._replicate('_curve_kernel', prepared, len(df))
+        return {key: (point[key][0],) + self.percentile_band(replicates[key]) for key in point}
+
+    # (point, lower, upper) counterparts of the inherited curve methods,
+    # which keep the DoublyRobustEstimator return values
+    def roc_band(self, df, method):
+        curves = self.curves(df, method)
+        return curves['fpr'], curves['tpr']
+
+    def precision_recall_band(self, df, method):
+        curves = self.curves(df, method)
+        return curves['tpr'], curves['precision']
+
+    def calibration_band(self, df, method):
+        curves = self.curves(df, method)
+        return curves['calibration'], curves['avg_score']
+
+    # the EqualizedOddsPostProcessingAnalysis.error_analysis table with
+    # <metric>_lower / <metric>_upper columns
+    def error_analysis(self, df, columns = ('counterfactual', 'eo_fair_pred'),
+                       methods = ('Original', 'Post-Processed')):
+        prepared = self._prepare_errors(df, columns)
+        point = self._error_kernel(np.ones((1, len(df))), prepared)
+        replicates = self._replicate('_error_kernel', prepared, len(df))
+
+        rows = []
+        for m, method in enumerate(methods):
+            for g, group in reversed(list(enumerate(prepared['groups']))):
+                row = {'Group': 'A = {}'.format(group), 'Method': method}
+                for metric in ['cGFNR', 'cGFPR', 'oGFNR', 'oGFPR']:
+                    lower, upper = self.percentile_band(replicates[metric][:, m, g])
+                    row.update({metric: point[metric][0, m, g],
+                                metric + '_lower': lower, metric + '_upper': upper})
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    # thresholds above every score leave precision undefined in all replicates
+    def percentile_band(self, replicates):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lower, upper = np.nanpercentile(replicates, [50 * self.alpha, 100 - 50 * self.alpha], axis = 0)
+        return lower, upper
+
+    def _prepare_curves(self, df, method):
+        scores = df[method].to_numpy(dtype = float)
+        y_true = self.pseudo_outcome(df)
+        order = np.argsort(scores)
+        scores, y_true = scores[order], y_true[order]
+        n = len(scores)
+
+        # thresholds and quantile bins both cut the sorted rows into
+        # contiguous ranges; reduce over the union of their boundaries
+        grid_starts = np.searchsorted(scores, np.linspace(0, 1, self.num_points), side = 'left')
+        edges = np.quantile(scores, np.linspace(0, 1, self.n_bins + 1))
+        bin_starts = np.r_[0, np.searchsorted(scores, edges[1:-1], side = 'right')]
+        starts = np.unique(np.r_[0, grid_starts, bin_starts])
+        starts = starts[starts < n]
+        return {
+            'scores': scores,
+            'y_true': y_true,
+            'starts': starts,
+            'grid': np.searchsorted(starts, grid_starts),
+            'bins': np.searchsorted(starts, np.r_[bin_starts, n]),
+        }
+
+    # Rows are exchangeable under the resampling weights, so the weight
+    # columns are taken to be in the prepared (score-sorted) row order.
+    def _curve_kernel(self, W, prepared):
+        starts = prepared['starts']
+        prefix = {}
+        for key, values in [('w', None), ('wy', prepared['y_true']), ('ws', prepared['scores'])]:
+            sums = np.add.reduceat(W if values is None else W * values, starts, axis = 1)
+            prefix[key] = np.concatenate([np.zeros((len(W), 1)), np.cumsum(sums, axis = 1)], axis = 1)
+        total_w, total_y = prefix['w'][:, -1:], prefix['wy'][:, -1:]
+
+        grid = prepared['grid']
+        predicted = total_w - prefix['w'][:, grid]
+        false_negatives = prefix['wy'][:, grid]
+        true_positives = total_y - false_negatives
+        bins = prepared['bins']
+        count = np.diff(prefix['w'][:, bins], axis = 1)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return {
+                'fpr': (predicted - true_positives) / (total_w - total_y),
+                'tpr': 1 - false_negatives / total_y,
+                'precision': true_positives / predicted,
+                'calibration': np.diff(prefix['wy'][:, bins], axis = 1) / count,
+                'avg_score': np.diff(prefix['ws'][:, bins], axis = 1) / count,
+            }
+
+    # one design matrix whose columns are, per (label type, group, label
+    # value), the cell indicator followed by the indicator times each score
+    # column; a batch of weighted cell sums is then a single W @ M
+    def _prepare_errors(self, df, columns):
+        scores = df[list(columns)].to_numpy(dtype = float)
+        sensitive = df[self.sensitive].to_numpy()
+        groups = np.unique(sensitive)
+        design = []
+        for label in [self.counterfactual, self.observational]:
+            y_true = df[label].to_numpy()
+            for group in groups:
+                for value in [0, 1]:
+                    indicator = ((sensitive == group) & (y_true == value)).astype(float)
+                    design.append(indicator[:, np.newaxis])
+                    design.append(indicator[:, np.newaxis] * scores)
+        return {'design': np.hstack(design), 'groups': groups, 'n_columns': len(columns)}
+
+    def _error_kernel(self, W, prepared):
+        sums = W @ prepared['design']
+        sums = sums.reshape(len(W), 2, len(prepared['groups']), 2, 1 + prepared['n_columns'])
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            means = sums[..., 1:] / sums[..., :1]
+        # means: (replicate, label type, group, label value, column) -> (replicate, column, group)
+        means = np.moveaxis(means, -1, 2)
+        return {
+            'cGFNR': 1 - means[:, 0, :, :, 1], 'cGFPR': means[:, 0, :, :, 0],
+            'oGFNR': 1 - means[:, 1, :, :, 1], 'oGFPR': means[:, 1, :, :, 0],
+        }
+
+    # workers receive the prepared arrays as a SharedFrame, so a task
+    # pickles a descriptor rather than O(n) data
+    def _replicate(self, kernel, prepared, n):
+        batches = [(batch, min(self.batch_size, self.n_replicates - start))
+                   for batch, start in enumerate(range(0, self.n_replicates, self.batch_size))]
+        if self.max_workers == 1:
+            results = [self._run_batch((kernel, prepared, {}, n, batch, size)) for batch, size in batches]
+        else:
+            arrays = {key: value for key, value in prepared.items() if isinstance(value, np.ndarray)}
+            rest = {key: value for key, value in prepared.items() if key not in arrays}
+            with SharedFrame.publish(arrays) as shared, \
+                    ProcessPoolExecutor(max_workers = self.max_workers) as executor:
+                tasks = [(kernel, shared, rest, n, batch, size) for batch, size in batches]
+                results = list(executor.map(self._run_batch, tasks))
+        return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+    def _run_batch(self, task):
+        kernel, prepared, rest, n, batch, size = task
+        if isinstance(prepared, SharedFrame):
+            prepared = dict(prepared.arrays, **rest)
+        return getattr(self, kernel)(self._weights(batch, size, n), prepared)
+
+    # every batch draws from its own stream, so bands do not depend on
+    # max_workers or batch scheduling
+    def _weights(self, batch, size, n):
+        rng = self.streams.generator(batch)
+        if self.scheme == 'multinomial':
+            return np.vstack([np.bincount(rng.integers(0, n, n), minlength = n) for _ in range(size)]).astype(float)
+        return rng.poisson(1.0, size = (size, n)).astype(float)
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from collections import deque
+
+from src.HistogramSketch import HistogramSketch
+from src.DoublyRobustEstimator import DoublyRobustEstimator
+
+class CounterfactualMonitor(DoublyRobustEstimator):
+    # Keeps additive (hence mergeable) sufficient statistics per micro-batch:
+    #   bins      (group, score, grid bin, HistogramSketch.fields)
+    #   cells     (group, label, label value, [weight, score sums...]) for the
+    #             counterfactual and observational labels
+    #   confusion (group, score, y_true, round(score)) observational weights
+    # DR curves are answered by a HistogramSketch built from the bins.
+    def __init__(self, parameters, scores = ('counterfactual', 'eo_fair_pred'), groups = (0, 1),
+                 window = None, mode = 'sliding'):
+        super().__init__(parameters = parameters)
+        self.scores = list(scores)
+        self.groups = np.sort(np.asarray(groups))
+        self.window = window # micro-batches per window; None accumulates everything
+        self.mode = mode # 'sliding' or 'tumbling'
+        self.treat_num = self.parameters['treat']['name']
+        self.sensitive = self.parameters['features']['sensitive']
+        self.observational = self.parameters['target']['observational']
+        self.counterfactual = self.parameters['target']['counterfactual']
+        self.sample_weight = self.parameters.get('sample_weight')
+        self.labels = [self.counterfactual, self.observational]
+        self.sketch = HistogramSketch(self.parameters, self.scores, self.num_points)
+        self.buckets = deque()
+        self.totals = self.empty()
+        self.closed = None # statistics of the last completed tumbling window
+
+    def empty(self):
+        G, S = len(self.groups), len(self.scores)
+        return {
+            'bins': np.zeros((G, S, self.num_points, len(HistogramSketch.fields))),
+            'cells': np.zeros((G, len(self.labels), 2, 1 + S)),
+            'confusion': np.zeros((G, S, 2, 2)),
+        }
+
+    def merge(self, *stats):
+        merged = self.empty()
+        for other in stats:
+            for key in merged:
+                merged[key] += other[key]
+        return merged
+
+    # O(len(batch)); labels missing from the batch (e.g. an unobserved
+    # counterfactual outcome) contribute nothing to their cells
+    def summarize(self, batch):
+        G = len(self.groups)
+        sensitive = batch[self.sensitive].to_numpy()
+        groups = np.searchsorted(self.groups, sensitive)
+        if np.any(groups >= G) or np.any(self.groups[np.minimum(groups, G - 1)] != sensitive):
+            raise ValueError('Unknown {} values: {}'.format(self.sensitive, np.setdiff1d(sensitive, self.groups)))
+        weights = np.ones(len(batch)) if not self.sample_weight else batch[self.sample_weight].to_numpy(dtype = float)
+        y_dr = np.asarray(self._estimate(batch), dtype = float)
+        observed = np.asarray(batch[self.observational]).astype(int)
+
+        stats = self.empty()
+        scores = [batch[score].to_numpy(dtype = float) for score in self.scores]
+        for s, values in enumerate(scores):
+            stats['bins'][:, s] = self.sketch.histogram(values, y_dr, weights, groups, G)
+            codes = groups * 4 + observed * 2 + np.round(values).astype(int)
+            stats['confusion'][:, s] = np.bincount(codes, weights = weights, minlength = 4 * G).reshape(G, 2, 2)
+        for l, label in enumerate(self.labels):
+            if label not in batch:
+                continue
+            codes = groups * 2 + np.asarray(batch[label]).astype(int)
+            for k, summand in enumerate([weights] + [weights * values for values in scores]):
+                stats['cells'][:, l, :, k] = np.bincount(codes, weights = summand, minlength = 2 * G).reshape(G, 2)
+        return stats
+
+    def update(self, batch):
+        return self.push(self.summarize(batch))
+
+    # statistics may also come from summarize() on another shard; returns
+    # the statistics of a tumbling window when this push completes it
+    def push(self, stats):
+        self.totals = self.merge(self.totals, stats)
+        if self.window is None:
+            return None
+        self.buckets.append(stats)
+        if self.mode == 'tumbling':
+            if len(self.buckets) < self.window:
+                return None
+            self.closed, self.totals = self.totals, self.empty()
+            self.buckets.clear()
+            return self.closed
+        if len(self.buckets) > self.window:
+            expired = self.buckets.popleft()
+            for key in self.totals:
+                self.totals[key] -= expired[key]
+        return None
+
+    # Queries read the current window unless stats are given; group = None
+    # pools all groups. The inherited (df, method) curves are left intact.
+    def window_roc_curve(self, score = None, group = None, stats = None):
+        return self.histogram_sketch(score, group, stats).to_roc_curve()
+
+    def window_precision_recall_curve(self, score = None, group = None, stats = None):
+        return self.histogram_sketch(score, group, stats).to_precision_recall_curve()
+
+    # equal-width grid bins, see HistogramSketch.to_calibration_curve
+    def window_calibration_curve(self, score = None, group = None, stats = None):
+        return self.histogram_sketch(score, group, stats).to_calibration_curve()
+
+    # the EqualizedOddsPostProcessingAnalysis.error_analysis table
+    def error_analysis(self, methods = ('Original', 'Post-Processed'), stats = None):
+        cells = (self.totals if stats is None else stats)['cells']
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            means = cells[..., 1:] / cells[..., :1]
+        rows = []
+        for s, method in enumerate(methods):
+            for g in reversed(range(len(self.groups))):
+                rows.append({
+                    'Group': 'A = {}'.format(self.groups[g]), 'Method': method,
+                    'cGFNR': 1 - means[g, 0, 1, s], 'cGFPR': means[g, 0, 0, s],
+                    'oGFNR': 1 - means[g, 1, 1, s], 'oGFPR': means[g, 1, 0, s],
+                })
+        return pd.DataFrame(rows)
+
+    # MetricFrameGenerator.generate over the window, without raw rows
+    def group_metrics(self, score = None, stats = None):
+        s = self.scores.index(score or self.scores[0])
+        stats = self.totals if stats is None else stats
+        cells = stats['confusion'][:, s].reshape(len(self.groups), 4)
+        totals = cells.sum(axis = 1)
+        tnr, fpr, fnr, tpr = (cells / totals[:, np.newaxis]).T
+        base_rate = stats['cells'][:, 1, 1, 0] / stats['cells'][:, 1, :, 0].sum(axis = 1)
+        return pd.DataFrame({'base_rate': base_rate, 'tnr': tnr, 'fpr': fpr, 'fnr': fnr, 'tpr': tpr},
+                            index = pd.Index(self.groups, name = self.sensitive))
+
+    def histogram_sketch(self, score = None, group = None, stats = None):
+        score = score or self.scores[0]
+        bins = (self.totals if stats is None else stats)['bins'][:, self.scores.index(score)]
+        bins = bins.sum(axis = 0) if group is None else bins[np.searchsorted(self.groups, group)]
+        return HistogramSketch(self.parameters, [score], self.num_points, bins)
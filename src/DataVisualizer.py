@@ -1,20 +1,20 @@
 import numpy as np
-import pandas as pd
-import matplotlib as mpl
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 
-from src.DoublyRobustEstimator import DoublyRobustEstimator
+class DataVisualizer():
+    # headless figures are drawn on Agg canvases outside pyplot and kept
+    # per process, keyed by layout, so later renders only redraw the data;
+    # matplotlib itself is only imported once something is drawn
+    _templates = {}
 
-class DataVisualizer(DoublyRobustEstimator):
-    def __init__(self, plt_type, legend_name, parameters, n_bins = None):
+    def __init__(self, plt_type, legend_name, parameters, n_bins = None, headless = False):
         self.parameters = parameters
         self.observational = self.parameters['target']['observational']
         self.counterfactual = self.parameters['target']['counterfactual']
-        super().__init__(parameters = self.parameters)
         self.plt_type = plt_type #'calibration', 'roc', 'precision_recall'
         self.legend_name = legend_name
-        if self.plt_type == 'calibration':
-            self.n_bins = n_bins
+        self.headless = headless # never call plt.show() and reuse figure templates
+        self.n_bins = n_bins
         self.plt_settings = {
             "figure.dpi": 72,
             "figure.facecolor": 'white',
@@ -24,64 +24,111 @@ class DataVisualizer(DoublyRobustEstimator):
             'axes.formatter.limits': (0, 1),
             'legend.frameon': False,
         }
-    
+
     def visualize(self, axis_labels, df, *args, save = ''):
-        x_axis_label, y_axis_label = axis_labels
+        self.render(axis_labels, args, save = save)
+
+    # panels: [title, (x, y, color, label[, (lower, upper)]), ...]
+    def render(self, axis_labels, panels, save = ''):
+        import matplotlib as mpl
         with mpl.rc_context(self.plt_settings):
-            num_plots = len(args)
-            plt.rcParams["figure.figsize"] = (5 * num_plots, 5)
-            fig = plt.figure()
-            fig, axes = plt.subplots(1, num_plots)
-            for axis, lines in zip(axes.ravel(), args):
-                title = lines.pop(0)
-                for x, y, color, label in lines:
-                    axis.plot(x, y, color = color, label= label)
-                    if self.plt_type == 'calibration':
-                        self._plot_confidence_intervals(axis, df, x, y, color, label, title)
-
-                padding = 0.05; lower, upper = 0 - padding, (0.5 if self.plt_type == 'reweighted' else 1) + padding
-                axis.set_xlim([lower, upper + (1.5 if self.plt_type == 'reweighted' else 0)])
-                axis.set_ylim([lower, upper])
-                axis.ticklabel_format(style='plain')
-
-                if self.plt_type == 'calibration':
-                    
-                    _x = np.linspace(lower, upper, 50)
-                    _y = np.linspace(lower, upper, 50)
-                    axis.plot(_x, _y, color = 'black', linestyle = '--')
-
-                axis.set_title(title)
-                if self.plt_type != 'reweighted':
-                    axis.set_xticks([0, 0.25, 0.5, 0.75, 1])
-                    axis.set_yticks([0, 0.25, 0.5, 0.75, 1])
-
-            fig.text(0.5, 0, x_axis_label, ha='center', va='center')
-            fig.text(0, 0.5, y_axis_label, ha='center', va='center', rotation='vertical')
-
-            handles, labels = axis.get_legend_handles_labels()
-            fig.legend(handles, labels, bbox_to_anchor=(1, 1), loc=2, title=self.legend_name)
-
-            fig.tight_layout();
+            if not self.headless:
+                import matplotlib.pyplot as plt
+                fig, axes = plt.subplots(1, len(panels), figsize = (5 * len(panels), 5), squeeze = False)
+                self._decorate(fig, axes.ravel(), axis_labels)
+                self._draw(fig, axes.ravel(), panels)
+                fig.tight_layout()
+                if save:
+                    fig.savefig(save, bbox_inches='tight')
+                else:
+                    plt.show()
+                plt.close(fig)
+                return
+
+            template = self._template(axis_labels, len(panels))
+            for artist in template['artists']:
+                artist.remove()
+            template['artists'] = self._draw(template['fig'], template['axes'], panels)
+            if template['bbox'] is None:
+                template['bbox'] = self._layout(template['fig'])
             if save:
-                plt.savefig(save, bbox_inches='tight')
-            plt.show()
-            plt.close('all')
-
-    def _plot_confidence_intervals(self, axis, df, x, y, color, label, title, alpha = 0.5):
-        if title == 'True Counterfactual':
-            response = self.counterfactual
-        else:
-            response = self.observational
-        _df = df.copy()
-        _df.sort_values(label.lower(), inplace=True)
-        _df['bin'] = pd.qcut(_df[label.lower()], self.n_bins)
-        y_lower, y_upper = [], []
-        for _y, (_, __df) in zip(y, _df.groupby('bin')):
-            if title == 'Doubly-Robust':
-                est = self._estimate(__df)
-                delta =  1.96*est.std()/np.sqrt(len(est))
-            else:
-                delta =  1.96*__df[response].std()/np.sqrt(len(__df))
-            y_lower.append(_y - delta)
-            y_upper.append(_y + delta)
-        axis.fill_between(x, np.array(y_lower), np.array(y_upper), color = color, alpha = alpha)
\ No newline at end of file
+                template['fig'].savefig(save, bbox_inches = template['bbox'])
+
+    # figures: iterable of (axis_labels, panels, save); every worker keeps
+    # its own templates, so each figure type is laid out once per process
+    def render_many(self, figures, max_workers = None):
+        figures = list(figures)
+        if max_workers == 1:
+            list(map(self._render_headless, figures))
+            return
+        with ProcessPoolExecutor(max_workers = max_workers) as executor:
+            list(executor.map(self._render_headless, figures))
+
+    def _render_headless(self, figure):
+        axis_labels, panels, save = figure
+        self.headless = True
+        self.render(axis_labels, panels, save = save)
+
+    def _template(self, axis_labels, num_plots):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        key = (self.plt_type, self.legend_name, tuple(axis_labels), num_plots)
+        if key not in self._templates:
+            fig = Figure(figsize = (5 * num_plots, 5))
+            FigureCanvasAgg(fig)
+            axes = fig.subplots(1, num_plots, squeeze = False).ravel()
+            self._decorate(fig, axes, axis_labels)
+            self._templates[key] = {'fig': fig, 'axes': axes, 'artists': [], 'bbox': None}
+        return self._templates[key]
+
+    # Labels and limits are fixed per template, so the tight bounding box is
+    # computed once; saving with it (and without a layout engine, which
+    # matplotlib >= 3.6 leaves behind) takes a single draw instead of two.
+    def _layout(self, fig):
+        import matplotlib as mpl
+        fig.tight_layout()
+        if hasattr(fig, 'set_layout_engine'):
+            fig.set_layout_engine(None)
+        bbox = fig.get_tightbbox(fig.canvas.get_renderer())
+        return bbox.padded(mpl.rcParams['savefig.pad_inches'])
+
+    # everything that does not depend on the data
+    def _decorate(self, fig, axes, axis_labels):
+        x_axis_label, y_axis_label = axis_labels
+        for axis in axes:
+            padding = 0.05; lower, upper = 0 - padding, (0.5 if self.plt_type == 'reweighted' else 1) + padding
+            axis.set_xlim([lower, upper + (1.5 if self.plt_type == 'reweighted' else 0)])
+            axis.set_ylim([lower, upper])
+            axis.ticklabel_format(style='plain')
+
+            if self.plt_type == 'calibration':
+
+                _x = np.linspace(lower, upper, 50)
+                _y = np.linspace(lower, upper, 50)
+                axis.plot(_x, _y, color = 'black', linestyle = '--')
+
+            if self.plt_type != 'reweighted':
+                axis.set_xticks([0, 0.25, 0.5, 0.75, 1])
+                axis.set_yticks([0, 0.25, 0.5, 0.75, 1])
+
+        fig.text(0.5, 0, x_axis_label, ha='center', va='center')
+        fig.text(0, 0.5, y_axis_label, ha='center', va='center', rotation='vertical')
+
+    # returns the artists added, so a template can be cleared for reuse
+    def _draw(self, fig, axes, panels):
+        artists = []
+        for axis, lines in zip(axes, panels):
+            title, lines = lines[0], lines[1:]
+            for line in lines:
+                x, y, color, label = line[:4]
+                artists.extend(axis.plot(x, y, color = color, label= label))
+                if len(line) > 4:
+                    artists.append(self._plot_confidence_intervals(axis, x, *line[4], color = color))
+            axis.set_title(title)
+
+        handles, labels = axis.get_legend_handles_labels()
+        artists.append(fig.legend(handles, labels, bbox_to_anchor=(1, 1), loc=2, title=self.legend_name))
+        return artists
+
+    def _plot_confidence_intervals(self, axis, x, y_lower, y_upper, color, alpha = 0.5):
+        return axis.fill_between(x, y_lower, y_upper, color = color, alpha = alpha)
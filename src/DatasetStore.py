@@ -0,0 +1,105 @@
+import os
+import json
+import shutil
+import functools
+import numpy as np
+import pandas as pd
+
+class DatasetStore():
+    # <directory>/<name>/seed_<seed>/manifest.json and one <column>.npy per
+    # column. Loading memory-maps every column read-only, so frames are views
+    # of the page cache: processes opening the same dataset share one copy
+    # and arrays larger than RAM are paged in only where they are read.
+    # String and categorical columns are stored as integer codes.
+    def __init__(self, directory = './data'):
+        self.directory = directory
+
+    def save(self, name, seed, df, attrs = None):
+        self.write_chunks(name, seed, [df], len(df), attrs = attrs)
+
+    # chunks: DataFrames with the same columns and dtypes, e.g. from
+    # SyntheticData.generate_chunks, written straight into preallocated files
+    def write_chunks(self, name, seed, chunks, length, attrs = None):
+        path = self._path(name, seed)
+        staging = path + '.tmp'
+        shutil.rmtree(staging, ignore_errors = True)
+        os.makedirs(staging)
+        manifest, files, categories, start = {'length': length, 'attrs': attrs or {}, 'columns': []}, {}, {}, 0
+        for chunk in chunks:
+            for column in chunk.columns:
+                values, categories[column] = self._encode(chunk[column], categories.get(column))
+                if column not in files:
+                    manifest['columns'].append({'name': column, 'categories': categories[column],
+                                                'object': chunk[column].dtype == object})
+                    files[column] = np.lib.format.open_memmap(
+                        os.path.join(staging, column + '.npy'), mode = 'w+', dtype = values.dtype, shape = (length,))
+                files[column][start:start + len(chunk)] = values
+            start += len(chunk)
+        if start != length:
+            raise ValueError('Wrote {} rows of {} declared for {}/{}'.format(start, length, name, seed))
+        for array in files.values():
+            array.flush()
+        files.clear()
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        shutil.rmtree(path, ignore_errors = True)
+        os.replace(staging, path)
+
+    # every key of attrs, when given, must match the attrs the dataset was written with
+    def exists(self, name, seed, attrs = None):
+        try:
+            manifest = self.manifest(name, seed)
+        except FileNotFoundError:
+            return False
+        attrs = json.loads(json.dumps(attrs or {}))
+        return all(manifest['attrs'].get(key) == value for key, value in attrs.items())
+
+    def manifest(self, name, seed):
+        with open(os.path.join(self._path(name, seed), 'manifest.json')) as f:
+            return json.load(f)
+
+    def arrays(self, name, seed, columns = None):
+        manifest = self.manifest(name, seed)
+        columns = columns or [column['name'] for column in manifest['columns']]
+        return {column: np.load(os.path.join(self._path(name, seed), column + '.npy'), mmap_mode = 'r')
+                for column in columns}
+
+    # rows [start, stop) as a DataFrame over the memory maps; only string
+    # columns are decoded into memory
+    def load(self, name, seed, columns = None, start = 0, stop = None):
+        manifest = self.manifest(name, seed)
+        stop = manifest['length'] if stop is None else stop
+        arrays = self.arrays(name, seed, columns)
+        data = {}
+        for column in manifest['columns']:
+            if column['name'] not in arrays:
+                continue
+            values = arrays[column['name']][start:stop]
+            if column['categories'] is not None:
+                categories = np.array(column['categories'], dtype = object)
+                values = categories[values] if column['object'] else pd.Categorical.from_codes(values, categories)
+            data[column['name']] = values
+        data = {column: data[column] for column in (columns or data)}
+        return pd.DataFrame(data, index = pd.RangeIndex(start, stop), copy = False)
+
+    # picklable loaders of consecutive row ranges for process pools, e.g.
+    # HistogramSketch.fit_chunks; each worker maps the same files
+    def partitions(self, name, seed, chunk_size = 10**6, columns = None):
+        length = self.manifest(name, seed)['length']
+        return [functools.partial(self.load, name, seed, columns, start, min(start + chunk_size, length))
+                for start in range(0, length, chunk_size)]
+
+    # categories: those of the first chunk, which later chunks must reuse
+    def _encode(self, series, categories = None):
+        if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object:
+            if categories is None:
+                categories = sorted(series.unique()) if series.dtype == object else list(series.cat.categories)
+                categories = [str(c) for c in categories]
+            codes = pd.Categorical(series.astype(str), categories = categories).codes
+            if np.any(codes < 0):
+                raise ValueError('Column {} has values outside {}'.format(series.name, categories))
+            return codes, categories
+        return series.to_numpy(), None
+
+    def _path(self, name, seed):
+        return os.path.join(self.directory, name, 'seed_{}'.format(str(seed).zfill(3)))
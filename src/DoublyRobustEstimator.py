@@ -1,5 +1,4 @@
 import numpy as np
-import pandas as pd
 
 class DoublyRobustEstimator():
     def __init__(self, parameters):
@@ -7,48 +6,97 @@ class DoublyRobustEstimator():
         self.num_points = 100
         self.n_bins = 20
 
-    def calibration_curve(self, df, method):
-        df.sort_values(method, inplace=True)
-        df['bin'] = pd.qcut(df[method], self.n_bins)
-        avg_scores, calibrations = [], []
-        for _, _df in df.groupby('bin'):
-            avg_score = _df[method].mean()
-            est = self._estimate(_df)
-            delta = 1.96*est.std()/np.sqrt(len(est))
-            avg_scores.append(avg_score)
-            calibrations.append(est.mean())
-        return np.array(calibrations), np.array(avg_scores)
+    def calibration_curve(self, df, method, bands = False):
+        scores = df[method].to_numpy(dtype = float)
+        avg_scores, calibrations, std, count = self._binned_statistics(scores, self.pseudo_outcome(df))
+        if bands:
+            return calibrations, avg_scores, self._confidence_band(calibrations, std, count)
+        return calibrations, avg_scores
 
     def precision_recall_curve(self, df, method):
-        return 1 - self.false_negative_rate(df, method), self.precision(df, method)
+        _, fnr, precision, _ = self._rates(df, method)
+        return 1 - fnr, precision
 
     def roc_curve(self, df, method):
-        return self.false_positive_rate(df, method), 1 - self.false_negative_rate(df, method)
+        fpr, fnr, _, _ = self._rates(df, method)
+        return fpr, 1 - fnr
+
+    # distinct = True evaluates at every distinct score (descending, led by
+    # np.inf) like sklearn.metrics.roc_curve instead of the fixed grid
+    def curve(self, df, method, distinct = False):
+        fpr, fnr, precision, thresholds = self._rates(df, method, distinct)
+        return fpr, 1 - fnr, precision, thresholds
 
     def false_negative_rate(self, df, method):
-        domain = np.linspace(0, 1, self.num_points).reshape(-1, 1)
-        pred_label = 1 - (df[method].values >= domain).astype(int)
-        y_true = self._estimate(df)
-        return np.mean(self._numerator(pred_label, y_true), axis = 1) / np.array(y_true).mean()
+        return self._rates(df, method)[1]
 
     def false_positive_rate(self, df, method):
-        domain = np.linspace(0, 1, self.num_points).reshape(-1, 1)
-        pred_label = (df[method].values >= domain).astype(int)
-        y_true = 1 - self._estimate(df)
-        return np.mean(self._numerator(pred_label, y_true), axis = 1) / np.array(y_true).mean()
+        return self._rates(df, method)[0]
 
     def precision(self, df, method):
-        precisions = []
-        for t in np.linspace(0, 1, self.num_points):
-            _df = df[df[method] >= t]
-            y_true = self._estimate(_df)
-            precisions.append(y_true.mean())
-        return np.array(precisions)
+        return self._rates(df, method)[2]
+
+    def _rates(self, df, method, distinct = False):
+        scores = df[method].to_numpy(dtype = float)
+        y_true = self.pseudo_outcome(df)
+        order = np.argsort(scores)
+        return self._sorted_rates(scores[order], y_true[order], distinct)
+
+    def _sorted_rates(self, scores, y_true, distinct = False):
+        if distinct:
+            first = np.r_[True, scores[1:] != scores[:-1]]
+            thresholds = np.r_[np.inf, scores[first][::-1]]
+        else:
+            thresholds = np.linspace(0, 1, self.num_points)
+
+        # rows scored below each threshold form a prefix of the sorted scores
+        below = np.searchsorted(scores, thresholds, side = 'left')
+        cumulative = np.concatenate(([0.], np.cumsum(y_true)))
+        n, positives = len(scores), cumulative[-1]
+        false_negatives = cumulative[below]
+        true_positives = positives - false_negatives
+        false_positives = (n - below) - true_positives
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            fpr = false_positives / (n - positives)
+            fnr = false_negatives / positives
+            precision = true_positives / (n - below)
+        return fpr, fnr, precision, thresholds
+
+    # Evaluated from the current values on every call. Callers that reuse it
+    # across metrics hold on to the array themselves (MetricsEngine.fit reads
+    # it once per evaluation), so edits to df are never hidden by a cache.
+    def pseudo_outcome(self, df):
+        return np.ascontiguousarray(self._estimate(df), dtype = np.float64)
+
+    # per quantile bin (edges and closure as in pd.qcut): mean score, mean
+    # value, sample standard deviation of the value and row count
+    def _binned_statistics(self, scores, values):
+        order = np.argsort(scores)
+        return self._sorted_binned_statistics(scores[order], values[order])
+
+    # scores sorted ascending, so every bin is a contiguous run of rows
+    def _sorted_binned_statistics(self, scores, values):
+        edges = np.quantile(scores, np.linspace(0, 1, self.n_bins + 1))
+        if np.any(edges[1:] == edges[:-1]):
+            raise ValueError('Bin edges must be unique: {}'.format(edges))
+        bounds = np.r_[0, np.searchsorted(scores, edges[1:-1], side = 'right'), len(scores)]
+        count = np.diff(bounds)
+        avg_scores = self._bin_sums(scores, bounds) / count
+        means = self._bin_sums(values, bounds) / count
+        squares = self._bin_sums(np.square(values - np.repeat(means, count)), bounds)
+        return avg_scores, means, np.sqrt(squares / (count - 1)), count
+
+    # sums over values[bounds[i]:bounds[i + 1]], zero for empty runs
+    def _bin_sums(self, values, bounds):
+        sums = np.add.reduceat(values, np.minimum(bounds[:-1], len(values) - 1))
+        sums[bounds[:-1] == bounds[1:]] = 0
+        return sums
 
-    def _numerator(self, pred_label, y_true):
-        return np.multiply(pred_label, np.array(y_true)[np.newaxis, :])
+    def _confidence_band(self, y, std, count, z = 1.96):
+        delta = (z * std / np.sqrt(count))[:len(y)]
+        return y - delta, y + delta
 
     def _estimate(self, df):
         treat_num = self.parameters['treat']['name']
         observational = self.parameters['target']['observational']
-        return (1 - df[treat_num]) / (1 - df['propensity']) * (df[observational] - df['counterfactual']) + df['counterfactual']
\ No newline at end of file
+        return (1 - df[treat_num]) / (1 - df['propensity']) * (df[observational] - df['counterfactual']) + df['counterfactual']
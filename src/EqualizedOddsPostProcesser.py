@@ -1,10 +1,18 @@
 import numpy as np
-import cvxpy as cp
+
+from src.RandomStreams import RandomStreams
 
 class EqualizedOddsPostProcesser():
+    # linprog layout: x = [sensitive.ravel(), nonsensitive.ravel()]; rows of
+    # each 2x2 table sum to one and the first column is capped just below one
+    _A_rows = np.kron(np.eye(4), np.ones(2))
+    _bounds = [(0, 1-1e-4), (0, None)] * 4
+
     def __init__(self, parameters, y_pred_name = 'counterfactual', 
-                 y_true_name = '_Y', sensitive_feature_name = '_A', seed = 0):
+                 y_true_name = '_Y', sensitive_feature_name = '_A', seed = 0, solver = 'linprog'):
         self.seed = seed
+        self.solver = solver # 'linprog' or the reference 'cvxpy' formulation
+        self.streams = RandomStreams(seed)
         self.parameters = parameters
         self.pred_name = y_pred_name
         self.true_name = self.parameters['target']['observational']
@@ -15,37 +23,71 @@ class EqualizedOddsPostProcesser():
         if not has_mix_rates:
             mix_rates = self.mix_rates(data, metric_frame)
 
-        data, results = dict(tuple(data.groupby(self.sensitive_feature_name))), {}
-        for value in [0, 1]:
-
-            p2p, n2p = mix_rates[value, :]
-
-            fair_pred = data[value][self.pred_name].values
-            __ = 1 - fair_pred.copy()
-
-            pp_indices, = self.__transform_preds(fair_pred)
-            pn_indices, = self.__transform_preds(__)
-
-            np.random.seed(self.seed)
-            np.random.shuffle(pp_indices)
-            np.random.shuffle(pn_indices)
-
-            n2p_indices = pn_indices[:int(len(pn_indices) * n2p)]
-            fair_pred[n2p_indices] = 1 - fair_pred[n2p_indices]
-            p2n_indices = pp_indices[:int(len(pp_indices) * (1 - p2p))]
-            fair_pred[p2n_indices] = 1 - fair_pred[p2n_indices]
-
-            results[value] = fair_pred
+        groups = data[self.sensitive_feature_name].to_numpy()
+        fair_pred = self.transform(data[self.pred_name].to_numpy(), groups, mix_rates)
+        results = {value: fair_pred[groups == value] for value in [0, 1]}
 
         if not has_mix_rates:
             return results, mix_rates
         else:
             return results
 
+    # Flips exactly int(n * rate) predictions per group (n2p of the negatives,
+    # 1 - p2p of the positives) and returns them in the input order.
+    def transform(self, scores, groups, mix_rates):
+        scores = np.asarray(scores, dtype = float)
+        groups = np.asarray(groups)
+        positive = np.round(scores) != 0
+        negative = np.round(1 - scores) != 0
+        fair_pred = scores.copy()
+        for value, (p2p, n2p) in enumerate(mix_rates):
+            rng = self.streams.generator(value)
+            in_group = groups == value
+            pp_indices = np.flatnonzero(in_group & positive)
+            pn_indices = np.flatnonzero(in_group & negative)
+
+            n2p_indices = self._choose(rng, pn_indices, int(len(pn_indices) * n2p))
+            p2n_indices = self._choose(rng, pp_indices, int(len(pp_indices) * (1 - p2p)))
+            flips = np.concatenate([n2p_indices, p2n_indices])
+            fair_pred[flips] = 1 - fair_pred[flips]
+        return fair_pred
+
     def mix_rates(self, data, metric_frame):
         base_rates = metric_frame.pop(item = 'base_rate')
-        S, N = tuple(np.reshape(metric_frame.to_numpy(), 
-                                newshape = (2,2,2)).astype(float))
+        S, N = tuple(np.reshape(metric_frame.to_numpy(), (2,2,2)).astype(float))
+
+        sensitive = data[self.sensitive_feature_name].to_numpy()
+        pred = data[self.pred_name].to_numpy(dtype = float)
+        true = data[self.true_name].to_numpy()
+        sm = self._given(pred[sensitive == 1], true[sensitive == 1])
+        om = self._given(pred[sensitive == 0], true[sensitive == 0])
+
+        if self.solver == 'cvxpy':
+            sensitive, nonsensitive = self._solve_cvxpy(S, N, sm, om, base_rates)
+        else:
+            sensitive, nonsensitive = self._solve_linprog(S, N, sm, om, base_rates)
+
+        results = [nonsensitive[::-1, 0], sensitive[::-1, 0]]
+        return np.vstack(results)
+
+    def _solve_linprog(self, S, N, sm, om, base_rates):
+        from scipy.optimize import linprog
+
+        # trace(S @ X) == sum(S.T * X)
+        c = np.concatenate([S.T.ravel(), N.T.ravel()])
+        A_eq = np.vstack([
+            self._A_rows,
+            np.concatenate([sm['given_n'].ravel() / (1 - base_rates[1]), -om['given_n'].ravel() / (1 - base_rates[0])]),
+            np.concatenate([sm['given_p'].ravel() / base_rates[1], -om['given_p'].ravel() / base_rates[0]]),
+        ])
+        b_eq = np.array([1, 1, 1, 1, 0, 0])
+        result = linprog(c, A_eq = A_eq, b_eq = b_eq, bounds = self._bounds, method = 'highs')
+        if not result.success:
+            raise ValueError('Mix rate LP failed: {}'.format(result.message))
+        return result.x[:4].reshape(2, 2), result.x[4:].reshape(2, 2)
+
+    def _solve_cvxpy(self, S, N, sm, om, base_rates):
+        import cvxpy as cp
 
         sensitive = cp.Variable((2,2), nonneg=True)
         nonsensitive = cp.Variable((2,2), nonneg=True)
@@ -55,19 +97,10 @@ class EqualizedOddsPostProcesser():
 
         error = sfpr_sfnr + ofpr_ofnr
 
-        sm = self._get_booleans(
-            data[data[self.sensitive_feature_name] == 1])
-        om = self._get_booleans(
-            data[data[self.sensitive_feature_name] == 0])
-
-        spn_given_p = cp.sum(cp.multiply(
-            self._given_p(data, sm), sensitive)) / base_rates[1]
-        spp_given_n = cp.sum(cp.multiply(
-            self._given_n(data, sm), sensitive)) / (1 - base_rates[1])
-        opn_given_p = cp.sum(cp.multiply(
-            self._given_p(data, om), nonsensitive)) / base_rates[0]
-        opp_given_n = cp.sum(cp.multiply(
-            self._given_n(data, om), nonsensitive)) / (1 - base_rates[0])
+        spn_given_p = cp.sum(cp.multiply(sm['given_p'], sensitive)) / base_rates[1]
+        spp_given_n = cp.sum(cp.multiply(sm['given_n'], sensitive)) / (1 - base_rates[1])
+        opn_given_p = cp.sum(cp.multiply(om['given_p'], nonsensitive)) / base_rates[0]
+        opp_given_n = cp.sum(cp.multiply(om['given_n'], nonsensitive)) / (1 - base_rates[0])
 
         constraints = [
             cp.sum(sensitive, axis = 1) == 1,
@@ -82,40 +115,24 @@ class EqualizedOddsPostProcesser():
 
         prob = cp.Problem(cp.Minimize(error), constraints)
         prob.solve()
-
-        results = [nonsensitive.value[::-1, 0], sensitive.value[::-1, 0]]
-        return np.vstack(results)
-
-    def _given_p(self, data, booleans):
-        const, flip = self._get_complements(data)
-        return np.array([
-            [(flip * booleans['fn']).mean(), (const * booleans['fn']).mean()],
-            [(const * booleans['tp']).mean(), (flip * booleans['tp']).mean()], 
-        ])
-
-    def _given_n(self, data, booleans):
-        const, flip = self._get_complements(data)
-        return np.array([
-            [(flip * booleans['tn']).mean(), (const * booleans['tn']).mean()],
-            [(const * booleans['fp']).mean(), (flip * booleans['fp']).mean()], 
-        ])
-
-
-    def _get_complements(self, data):
-        return data[self.pred_name], 1 - data[self.pred_name]
-
-    def _get_booleans(self, data):
+        return sensitive.value, nonsensitive.value
+
+    # group means of pred (const) and 1 - pred (flip) over each confusion
+    # cell, coded round(pred)*2 + true: tn = 0, fn = 1, fp = 2, tp = 3
+    def _given(self, pred, true):
+        codes = np.round(pred).astype(int) * 2 + true.astype(int)
+        const = np.bincount(codes, weights = pred, minlength = 4) / len(pred)
+        flip = np.bincount(codes, weights = 1 - pred, minlength = 4) / len(pred)
+        tn, fn, fp, tp = 0, 1, 2, 3
         return {
-            'tn': self._booleans(data, (0, 0)),
-            'fp': self._booleans(data, (1, 0)),
-            'fn': self._booleans(data, (0, 1)),
-            'tp': self._booleans(data, (1, 1)),
+            'given_p': np.array([[flip[fn], const[fn]], [const[tp], flip[tp]]]),
+            'given_n': np.array([[flip[tn], const[tn]], [const[fp], flip[fp]]]),
         }
 
-    def _booleans(self, data, indicator_tuple):
-        i, j = indicator_tuple
-        return np.logical_and(data[self.pred_name].round() == i,
-                              data[self.true_name] == j)
-
-    def __transform_preds(self, p):
-        return np.nonzero(np.round(p))
\ No newline at end of file
+    # uniform random subset of exactly count candidates: the count smallest
+    # of one batch of uniform keys, without shuffling the candidates
+    def _choose(self, rng, candidates, count):
+        if count >= len(candidates):
+            return candidates
+        keys = rng.random(len(candidates))
+        return candidates[np.argpartition(keys, count)[:count]]
\ No newline at end of file
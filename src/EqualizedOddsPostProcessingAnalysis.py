@@ -1,14 +1,15 @@
 import numpy as np
 import pandas as pd
-from sklearn.metrics import roc_curve
-from fairlearn.metrics import MetricFrame
 
 from src.DataVisualizer import DataVisualizer
+from src.MetricsEngine import MetricsEngine
 
 class EqualizedOddsPostProcessingAnalysis(DataVisualizer):
-    def __init__(self, parameters):
+    def __init__(self, parameters, headless = False, backend = 'native'):
         self.parameters = parameters
-        super().__init__(plt_type = 'roc', legend_name = 'Group', parameters = self.parameters)
+        self.backend = backend # 'native' or the reference melt + fairlearn MetricFrame
+        super().__init__(plt_type = 'roc', legend_name = 'Group', parameters = self.parameters,
+                         headless = headless)
         self.methods = ['Original', 'Post-Processed']
         self.columns = ['counterfactual', 'eo_fair_pred']
         self.colors = ['black', 'green']
@@ -21,7 +22,13 @@ class EqualizedOddsPostProcessingAnalysis(DataVisualizer):
         self.errors = []
 
     def visualize_roc(self, df, save = ''):
-        self._generate_dataset(df)
+        original, post_processed = self.roc_panels(df)
+        self.visualize(self.metrics, df, original, post_processed, save = save)
+        return original, post_processed
+
+    # engine: a MetricsEngine already fit on df with self.columns as scores
+    def roc_panels(self, df, engine = None):
+        self._generate_dataset(df, engine)
         original = ['Original']
         post_processed = ['Post-Processed']
         for k, v in self.dataset.items():
@@ -31,21 +38,42 @@ class EqualizedOddsPostProcessingAnalysis(DataVisualizer):
                 original.append(content)
             else:
                 post_processed.append(content)
-        self.visualize(self.metrics, df, original, post_processed, save = save)
         return original, post_processed
 
     def error_analysis(self, df):
         for adj in ['observational', 'counterfactual']:
-            self.errors.append(self._construct_metricframe(df, adj).by_group)
+            if self.backend == 'fairlearn':
+                self.errors.append(self._construct_metricframe(df, adj).by_group)
+            else:
+                self.errors.append(self._group_rates(df, adj))
         return self._postprocess_df(self.errors)
 
-    def _generate_dataset(self, df):
+    def _generate_dataset(self, df, engine = None):
+        if engine is None:
+            engine = MetricsEngine(self.parameters).fit(df, self.columns)
         for method, column in zip(self.methods, self.columns):
-            for i, _df in df.groupby([self.parameters['features']['sensitive']]):
+            for i in engine.groups:
                 group = 'A = 0' if not i else 'A = 1'
-                fpr, tpr, _ = roc_curve(_df[self.counterfactual], _df[column])
+                fpr, tpr = engine.panel_roc_curve(column, 'counterfactual', ('group', i))
                 self.dataset[(method, group, self.colors[i])] = {'fpr': fpr, 'tpr': tpr}
 
+    # the by_group frame of _construct_metricframe straight from the score
+    # columns: one bincount per column over group*2 + label gives the score
+    # sums of every (method, group, label) cell
+    def _group_rates(self, df, adj):
+        label = self.observational if adj == 'observational' else self.counterfactual
+        codes, groups = pd.factorize(df[self.sensitive].to_numpy(), sort = True)
+        codes = codes * 2 + df[label].to_numpy().astype(int)
+        count = np.bincount(codes, minlength = 2 * len(groups))
+        sums = np.stack([np.bincount(codes, weights = df[column].to_numpy(dtype = float), minlength = 2 * len(groups))
+                         for column in self.columns])
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            means = (sums / count).reshape(len(self.columns), len(groups), 2)
+        index = pd.MultiIndex.from_product([[False, True], ['A = {}'.format(group) for group in groups]],
+                                           names = ['Method', 'Group'])
+        return pd.DataFrame({adj[0] + 'GFNR': 1 - means[..., 1].ravel(), adj[0] + 'GFPR': means[..., 0].ravel()},
+                            index = index)
+
     def _postprocess_df(self, metricframes):
         errors = pd.concat(metricframes, axis = 1)
         errors.reset_index(inplace=True)
@@ -55,6 +83,7 @@ class EqualizedOddsPostProcessingAnalysis(DataVisualizer):
         return errors
 
     def _construct_metricframe(self, df, adj):
+        from fairlearn.metrics import MetricFrame
         ## adj = ['observational', 'counterfactual']
         _df = self._preprocess_df(df)
         metrics = {
@@ -0,0 +1,66 @@
+import json
+import numpy as np
+
+from src.RandomStreams import RandomStreams
+
+class EqualizedOddsStreamingPostProcesser():
+    # Online counterpart of EqualizedOddsPostProcesser.transform: instead of
+    # flipping exactly int(n * rate) predictions of a batch, every record is
+    # flipped independently with that rate, which matches the batch flip
+    # rates in expectation and needs no batch at all.
+    def __init__(self, mix_rates, seed = 0):
+        self.mix_rates = np.asarray(mix_rates, dtype = float)
+        self.seed = seed
+        self.rng = RandomStreams(seed).generator()
+        self._random = self.rng.random
+        self._p2n = 1 - self.mix_rates[:, 0]
+        self._n2p = self.mix_rates[:, 1]
+        self._rates = [(1 - p2p, n2p) for p2p, n2p in self.mix_rates.tolist()]
+
+    @classmethod
+    def load(cls, path, seed = 0):
+        return cls(np.load(path), seed = seed)
+
+    def save(self, path):
+        np.save(path, self.mix_rates)
+
+    # group codes index the rows of mix_rates; negative codes are rejected
+    # rather than wrapped around to the last groups
+    def transform_one(self, score, group):
+        if not 0 <= group < len(self._rates):
+            raise IndexError('Unknown group {} for {} groups'.format(group, len(self._rates)))
+        p2n, n2p = self._rates[group]
+        if round(score):
+            rate = p2n
+        elif round(1 - score):
+            rate = n2p
+        else:
+            return score
+        return 1 - score if self._random() < rate else score
+
+    def transform_batch(self, scores, groups):
+        scores = np.asarray(scores, dtype = float)
+        groups = np.asarray(groups)
+        if groups.size and (groups.min() < 0 or groups.max() >= len(self._rates)):
+            raise IndexError('Unknown groups {} for {} groups'.format(
+                np.unique(groups[(groups < 0) | (groups >= len(self._rates))]), len(self._rates)))
+        rates = np.where(np.round(scores) != 0, self._p2n[groups],
+                         np.where(np.round(1 - scores) != 0, self._n2p[groups], 0))
+        flips = self.rng.random(len(scores)) < rates
+        return np.where(flips, 1 - scores, scores)
+
+    # one JSON record per line, e.g. {"score": 0.73, "group": 1}; each is
+    # echoed back with its post-processed score under 'eo_fair_pred'. Blank
+    # lines are skipped and a malformed record is answered with
+    # {"error": ..., "line": ...} without stopping the service.
+    def serve(self, stdin, stdout):
+        for line in stdin:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                record['eo_fair_pred'] = self.transform_one(float(record['score']), int(record['group']))
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                record = {'error': '{}: {}'.format(type(e).__name__, e), 'line': line.rstrip('\n')}
+            stdout.write(json.dumps(record) + '\n')
+            stdout.flush()
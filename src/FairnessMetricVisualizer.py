@@ -1,34 +1,20 @@
-from sklearn.metrics import roc_curve
-from sklearn.metrics import precision_recall_curve
-from sklearn.calibration import calibration_curve
-
 from src.DataVisualizer import DataVisualizer
-from src.DoublyRobustEstimator import DoublyRobustEstimator
+from src.MetricsEngine import MetricsEngine
 
 class FairnessMetricVisualizer(DataVisualizer):
-    def __init__(self, metric, parameters):
+    def __init__(self, metric, parameters, headless = False):
         self.metric = metric
         self.parameters = parameters
-        if self.metric != 'calibration':
-            super().__init__(plt_type = self.metric, legend_name = 'Model', parameters = self.parameters)
-        else:
-            super().__init__(plt_type = self.metric, legend_name = 'Model', parameters = self.parameters, n_bins = 20)
+        super().__init__(plt_type = self.metric, legend_name = 'Model', parameters = self.parameters, n_bins = 20,
+                         headless = headless)
 
-        self.treat_num = self.parameters['treat']['name']
-        self.observational = self.parameters['target']['observational']
-        self.counterfactual = self.parameters['target']['counterfactual']
-        self.dr = DoublyRobustEstimator(parameters=self.parameters)
-        self.functions = {
-            'roc': (roc_curve, self.dr.roc_curve),
-            'precision_recall': (precision_recall_curve, self.dr.precision_recall_curve), 
-            'calibration': (self._calibration, self.dr.calibration_curve)
-        }
         self.titles = [
             "Observational Evaluation",
             "Control",
             "Doubly-Robust",
             "True Counterfactual"
         ]
+        self.panels = ['observational', 'control', 'doubly_robust', 'counterfactual']
         self.axis_labels = {
             'roc': ('False Positive Rate', "Recall"),
             'precision_recall': ("Recall", "Precision"),
@@ -37,34 +23,22 @@ class FairnessMetricVisualizer(DataVisualizer):
         self.colors = ['tab:blue', 'tab:orange']
         self.methods = ['Observational', 'Counterfactual']
 
-    # metric = key in self.functions
+    # metric = key in self.axis_labels
     def visualize_metric(self, df, save = ''):
-        function, doubly_robust = self.functions[self.metric]
-        figure = [self.axis_labels[self.metric], df]
-        for title in self.titles:
-            plot = [title]
-            for color, method in zip(self.colors, self.methods):
-                _df = df.copy()
-                score = method.lower()
-                if title == 'Control':
-                    _df = _df[_df[self.treat_num] == 0]
-                if title != 'Doubly-Robust':
-                    column = self.counterfactual if title == "True Counterfactual" else self.observational
-                    if self.metric == 'roc':
-                        x, y, _ = function(*_df[[column, score]].values.T)
-                    elif self.metric == 'precision_recall':
-                        y, x, _ = function(*_df[[column, score]].values.T)
-                    else:
-                        y, x = function(*_df[[column, score]].values.T)
-                else:
-                    if self.metric == 'calibration':
-                        y, x = doubly_robust(_df, score)
-                    else:
-                        x, y = doubly_robust(_df, score)
-                plot.append((x, y, color, method))
-            figure.append(plot)
+        figure = [self.axis_labels[self.metric], df] + self.metric_panels(df)
         self.visualize(*figure, save = save)
         return figure
 
-    def _calibration(self, x, y):
-        return calibration_curve(x, y, n_bins=20, strategy = 'quantile')
\ No newline at end of file
+    # engine: a MetricsEngine already fit on df, shared across metrics
+    def metric_panels(self, df, engine = None):
+        scores = [method.lower() for method in self.methods]
+        if engine is None:
+            engine = MetricsEngine(self.parameters, n_bins = self.n_bins).fit(df, scores)
+        panels = []
+        for title, panel in zip(self.titles, self.panels):
+            plot = [title]
+            for color, method, score in zip(self.colors, self.methods, scores):
+                x, y, *band = engine.curve(self.metric, score, panel)
+                plot.append((x, y, color, method) + tuple(band))
+            panels.append(plot)
+        return panels
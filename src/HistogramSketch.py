@@ -0,0 +1,123 @@
+import json
+import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.DoublyRobustEstimator import DoublyRobustEstimator
+
+class HistogramSketch(DoublyRobustEstimator):
+    # Per score column and threshold-grid bin [t_j, t_j+1): weight, DR
+    # positive mass, DR negative mass, squared pseudo-outcome and score sums.
+    # Every field is a sum, so merge is associative and commutative, and the
+    # DR ROC/PR read off a sketch equal DoublyRobustEstimator on the same rows.
+    fields = ['count', 'positive', 'negative', 'squares', 'score']
+
+    def __init__(self, parameters, scores = ('counterfactual',), num_points = 100, bins = None):
+        super().__init__(parameters = parameters)
+        self.scores = list(scores)
+        self.num_points = num_points
+        self.thresholds = np.linspace(0, 1, self.num_points)
+        self.sample_weight = self.parameters.get('sample_weight')
+        shape = (len(self.scores), self.num_points, len(self.fields))
+        self.bins = np.zeros(shape) if bins is None else np.asarray(bins, dtype = float).reshape(shape)
+
+    def update(self, df):
+        self.bins += self._sketch(df)
+        return self
+
+    # (n_groups, num_points, fields) sums of one score column, optionally
+    # split by integer group codes
+    def histogram(self, values, y_dr, weights, groups = None, n_groups = 1):
+        B = self.num_points
+        codes = np.clip(np.searchsorted(self.thresholds, values, side = 'right') - 1, 0, B - 1)
+        if groups is not None:
+            codes = codes + groups * B
+        summands = [weights, weights * y_dr, weights * (1 - y_dr), weights * np.square(y_dr), weights * values]
+        sums = [np.bincount(codes, weights = summand, minlength = n_groups * B) for summand in summands]
+        return np.stack(sums, axis = -1).reshape(n_groups, B, len(self.fields))
+
+    def merge(self, *others):
+        merged = HistogramSketch(self.parameters, self.scores, self.num_points, self.bins.copy())
+        for other in others:
+            if other.scores != self.scores or other.num_points != self.num_points:
+                raise ValueError('Cannot merge sketches of {} ({} points) and {} ({} points)'.format(
+                    self.scores, self.num_points, other.scores, other.num_points))
+            merged.bins += other.bins
+        return merged
+
+    # chunks: DataFrames, parquet paths or callables returning a DataFrame
+    # (e.g. DatasetStore.partitions), sketched in a process pool with at
+    # most two chunks per worker in flight and merged in submission order
+    def fit_chunks(self, chunks, max_workers = None):
+        if max_workers == 1:
+            for chunk in chunks:
+                self.bins += self._sketch(chunk)
+            return self
+        limit = 2 * (max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers = max_workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(self._sketch, chunk))
+                if len(pending) >= limit:
+                    self.bins += pending.popleft().result()
+            while pending:
+                self.bins += pending.popleft().result()
+        return self
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(meta['parameters'], meta['scores'], meta['num_points'], data['bins'])
+
+    def save(self, path):
+        meta = {'parameters': self.parameters, 'scores': self.scores, 'num_points': self.num_points}
+        np.savez(path, bins = self.bins, meta = np.array(json.dumps(meta)))
+
+    # named apart from the inherited (df, method) curves, which stay usable
+    def to_roc_curve(self, score = None):
+        fpr, tpr, _ = self._curves(score)
+        return fpr, tpr
+
+    def to_precision_recall_curve(self, score = None):
+        _, tpr, precision = self._curves(score)
+        return tpr, precision
+
+    # equal-width groups of grid bins (n_bins of them): quantile edges
+    # cannot be recovered from a merged sketch
+    def to_calibration_curve(self, score = None):
+        bins = self.bins[self._column(score)]
+        starts = np.linspace(0, self.num_points, self.n_bins, endpoint = False).astype(int)
+        count, positive, _, squares, scores = np.add.reduceat(bins, starts, axis = 0).T
+        nonzero = count > 0
+        count, positive, squares, scores = count[nonzero], positive[nonzero], squares[nonzero], scores[nonzero]
+        calibrations = positive / count
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            std = np.sqrt(np.maximum(squares - positive * calibrations, 0) / (count - 1))
+        return calibrations, scores / count, self._confidence_band(calibrations, std, count)
+
+    def _column(self, score):
+        return self.scores.index(score) if score is not None else 0
+
+    # rows scored at or above threshold j fall in bins j and up
+    def _curves(self, score):
+        bins = self.bins[self._column(score)]
+        above = np.cumsum(bins[::-1, :3], axis = 0)[::-1]
+        predicted, true_positives, false_positives = above.T
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            fpr = false_positives / false_positives[0]
+            tpr = true_positives / true_positives[0]
+            precision = true_positives / predicted
+        return fpr, tpr, precision
+
+    def _sketch(self, chunk):
+        if isinstance(chunk, str):
+            import pandas as pd
+            chunk = pd.read_parquet(chunk)
+        elif callable(chunk):
+            chunk = chunk()
+        y_dr = np.asarray(self._estimate(chunk), dtype = float)
+        weights = np.ones(len(chunk)) if not self.sample_weight else chunk[self.sample_weight].to_numpy(dtype = float)
+        return np.concatenate([self.histogram(chunk[score].to_numpy(dtype = float), y_dr, weights)
+                               for score in self.scores])
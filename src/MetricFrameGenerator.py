@@ -1,12 +1,10 @@
 import numpy as np
-from fairlearn.metrics import MetricFrame
-from fairlearn.metrics import true_negative_rate, false_negative_rate, true_positive_rate, false_positive_rate
-from fairlearn.metrics import selection_rate
-from sklearn.metrics import confusion_matrix
+import pandas as pd
 
 class MetricFrameGenerator():
-    def __init__(self, weights = None):
+    def __init__(self, weights = None, backend = 'native'):
         self.weights = weights
+        self.backend = backend # 'native' or the reference 'fairlearn' MetricFrame
         self.params = {
             'base_rate': {'sample_weight': self.weights},
             'tnr': {'sample_weight': self.weights},
@@ -23,6 +21,27 @@ class MetricFrameGenerator():
         }
 
     def generate(self, y_true, y_pred, sensitive_features):
+        if self.backend == 'fairlearn':
+            return self._generate_fairlearn(y_true, y_pred, sensitive_features)
+        groups, index = self._group_codes(sensitive_features)
+        y_true = np.asarray(y_true, dtype = float)
+        weights = np.ones(len(y_true)) if self.weights is None else np.asarray(self.weights, dtype = float)
+
+        # weighted 2x2 confusion counts of every group from one bincount over
+        # group*4 + y_true*2 + round(y_pred), laid out as tn, fp, fn, tp
+        codes = groups * 4 + y_true.astype(int) * 2 + np.round(np.asarray(y_pred, dtype = float)).astype(int)
+        cells = np.bincount(codes, weights = weights, minlength = 4 * len(index)).reshape(-1, 4)
+        totals = np.bincount(groups, weights = weights, minlength = len(index))
+        # combinations of sensitive values with no rows are NaN, as in fairlearn
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            base_rate = np.bincount(groups, weights = weights * y_true, minlength = len(index)) / totals
+            tnr, fpr, fnr, tpr = (cells / totals[:, np.newaxis]).T
+        return pd.DataFrame({'base_rate': base_rate, 'tnr': tnr, 'fpr': fpr, 'fnr': fnr, 'tpr': tpr},
+                            index = index)[list(self.metrics)]
+
+    def _generate_fairlearn(self, y_true, y_pred, sensitive_features):
+        from fairlearn.metrics import MetricFrame
+
         train_metricframe = MetricFrame(
             metrics=self.metrics,
             y_true=y_true, #train['Y'],
@@ -30,7 +49,24 @@ class MetricFrameGenerator():
             sensitive_features=sensitive_features, #train['A']
             sample_params=self.params
         )
-        return train_metricframe.by_group 
+        return train_metricframe.by_group
+
+    # integer group codes and the matching by_group index, named and sorted
+    # like fairlearn's; several sensitive columns index the full product of
+    # their values, including combinations that never occur
+    def _group_codes(self, sensitive_features):
+        if isinstance(sensitive_features, pd.DataFrame):
+            codes, levels = np.zeros(len(sensitive_features), dtype = np.int64), []
+            for column in sensitive_features.columns:
+                column_codes, uniques = pd.factorize(sensitive_features[column].to_numpy(), sort = True)
+                codes = codes * len(uniques) + column_codes
+                levels.append(uniques)
+            if len(levels) == 1:
+                return codes, pd.Index(levels[0], name = sensitive_features.columns[0])
+            return codes, pd.MultiIndex.from_product(levels, names = list(sensitive_features.columns))
+        name = getattr(sensitive_features, 'name', None)
+        codes, uniques = pd.factorize(np.asarray(sensitive_features), sort = True)
+        return codes, pd.Index(uniques, name = 'sensitive_feature_0' if name is None else name)
 
     ## Extension:
     # def _true_negative_rate(self, y_true, y_pred, sample_weight=None):
@@ -47,24 +83,26 @@ class MetricFrameGenerator():
 
     # ## Generalize fairlearn/fairlearn/metrics/_extra_metrics.py to add normalize as parameter
     def _true_negative_rate(self, y_true, y_pred, sample_weight=None):
-        tnr, fpr, fnr, tpr = confusion_matrix(
-            y_true, y_pred.round(), sample_weight=sample_weight, labels=[0, 1], normalize="all").ravel()
+        tnr, fpr, fnr, tpr = self._confusion_matrix(y_true, y_pred, sample_weight)
         return tnr
 
     def _false_positive_rate(self, y_true, y_pred, sample_weight=None):
-        tnr, fpr, fnr, tpr = confusion_matrix(
-            y_true, y_pred.round(), sample_weight=sample_weight, labels=[0, 1], normalize="all").ravel()
+        tnr, fpr, fnr, tpr = self._confusion_matrix(y_true, y_pred, sample_weight)
         return fpr
 
     def _false_negative_rate(self, y_true, y_pred, sample_weight=None):
-        tnr, fpr, fnr, tpr = confusion_matrix(
-            y_true, y_pred.round(), sample_weight=sample_weight, labels=[0, 1], normalize="all").ravel()
+        tnr, fpr, fnr, tpr = self._confusion_matrix(y_true, y_pred, sample_weight)
         return fnr
 
     def _true_positive_rate(self, y_true, y_pred, sample_weight=None):
-        tnr, fpr, fnr, tpr = confusion_matrix(
-            y_true, y_pred.round(), sample_weight=sample_weight, labels=[0, 1], normalize="all").ravel()
+        tnr, fpr, fnr, tpr = self._confusion_matrix(y_true, y_pred, sample_weight)
         return tpr
 
+    def _confusion_matrix(self, y_true, y_pred, sample_weight):
+        from sklearn.metrics import confusion_matrix
+
+        return confusion_matrix(
+            y_true, y_pred.round(), sample_weight=sample_weight, labels=[0, 1], normalize="all").ravel()
+
     def _base_rate(self, y_true, y_pred, sample_weight=None):
         return np.average(y_true, weights=sample_weight)
\ No newline at end of file
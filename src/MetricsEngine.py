@@ -0,0 +1,118 @@
+import numpy as np
+
+from src.DoublyRobustEstimator import DoublyRobustEstimator
+
+class MetricsEngine(DoublyRobustEstimator):
+    # panel -> (label, subset of rows); the doubly-robust panel evaluates the
+    # DR pseudo-outcome on the fixed threshold grid, the other panels follow
+    # sklearn's roc_curve, precision_recall_curve and quantile calibration_curve
+    panels = {
+        'observational': ('observational', None),
+        'control': ('observational', 'control'),
+        'doubly_robust': ('doubly_robust', None),
+        'counterfactual': ('counterfactual', None),
+    }
+
+    def __init__(self, parameters, n_bins = 20):
+        super().__init__(parameters = parameters)
+        self.n_bins = n_bins
+        self.treat_num = self.parameters['treat']['name']
+        self.sensitive = self.parameters['features']['sensitive']
+        self.observational = self.parameters['target']['observational']
+        self.counterfactual = self.parameters['target']['counterfactual']
+
+    # Reads every column once and sorts each score column once; all curves
+    # are computed from (masked) views of those sorted arrays. Subsets are
+    # 'control' (untreated rows) and ('group', value) for the sensitive feature.
+    def fit(self, df, scores = ('observational', 'counterfactual')):
+        labels = {
+            'observational': df[self.observational].to_numpy(dtype = float),
+            'counterfactual': df[self.counterfactual].to_numpy(dtype = float),
+            'doubly_robust': self.pseudo_outcome(df),
+        }
+        subsets = {'control': df[self.treat_num].to_numpy() == 0}
+        sensitive = df[self.sensitive].to_numpy()
+        self.groups = np.unique(sensitive)
+        for group in self.groups:
+            subsets[('group', group)] = sensitive == group
+
+        self.sorted = {}
+        for score in scores:
+            values = df[score].to_numpy(dtype = float)
+            order = np.argsort(values, kind = 'mergesort')
+            self.sorted[score] = {
+                'scores': values[order],
+                'labels': {key: label[order] for key, label in labels.items()},
+                'subsets': {key: subset[order] for key, subset in subsets.items()},
+            }
+        self._arrays, self._counts = {}, {}
+        return self
+
+    # metric: 'roc' -> (fpr, tpr), 'precision_recall' -> (recall, precision),
+    # 'calibration' -> (avg_scores, calibrations, (lower, upper))
+    def curve(self, metric, score, panel):
+        label, subset = self.panels[panel]
+        if label == 'doubly_robust':
+            scores, y_true = self.arrays(score, label)
+            if metric == 'calibration':
+                avg_scores, calibrations, std, count = self._sorted_binned_statistics(scores, y_true)
+                return avg_scores, calibrations, self._confidence_band(calibrations, std, count)
+            fpr, fnr, precision, _ = self._sorted_rates(scores, y_true)
+            return (fpr, 1 - fnr) if metric == 'roc' else (1 - fnr, precision)
+        return getattr(self, 'panel_' + metric + '_curve')(score, label, subset)
+
+    # panel_* read the fitted arrays; the inherited (df, method) curves are left intact
+    def panel_roc_curve(self, score, label = 'observational', subset = None):
+        fps, tps = self.counts(score, label, subset)
+        if len(fps) > 2:
+            keep = np.flatnonzero(np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])
+            fps, tps = fps[keep], tps[keep]
+        fps, tps = np.r_[0, fps], np.r_[0, tps]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return fps / fps[-1], tps / tps[-1]
+
+    def panel_precision_recall_curve(self, score, label = 'observational', subset = None):
+        fps, tps = self.counts(score, label, subset)
+        precision = tps / (tps + fps)
+        recall = tps / tps[-1] if tps[-1] else np.ones_like(tps)
+        return np.r_[recall[::-1], 0], np.r_[precision[::-1], 1]
+
+    # (avg_scores, calibrations, band) for non-empty quantile bins; the band
+    # is the normal interval from the label's sample std within each bin
+    def panel_calibration_curve(self, score, label = 'observational', subset = None):
+        scores, y_true = self.arrays(score, label, subset)
+        edges = np.percentile(scores, np.linspace(0, 1, self.n_bins + 1) * 100)
+        bounds = np.r_[0, np.searchsorted(scores, edges[1:-1], side = 'right'), len(scores)]
+        count = np.diff(bounds)
+        nonzero = count != 0
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            means = self._bin_sums(y_true, bounds) / count
+            squares = self._bin_sums(np.square(y_true - np.repeat(means, count)), bounds)
+            count = count[nonzero]
+            avg_scores = self._bin_sums(scores, bounds)[nonzero] / count
+            calibrations = means[nonzero]
+            std = np.sqrt(squares[nonzero] / (count - 1))
+        return avg_scores, calibrations, self._confidence_band(calibrations, std, count)
+
+    def arrays(self, score, label, subset = None):
+        key = (score, label, subset)
+        if key not in self._arrays:
+            data = self.sorted[score]
+            scores, y_true = data['scores'], data['labels'][label]
+            if subset is not None:
+                mask = data['subsets'][subset]
+                scores, y_true = scores[mask], y_true[mask]
+            self._arrays[key] = (scores, y_true)
+        return self._arrays[key]
+
+    # false and true positive counts at each distinct score, highest first,
+    # as in sklearn's _binary_clf_curve; shared by the ROC and PR curves
+    def counts(self, score, label, subset = None):
+        key = (score, label, subset)
+        if key not in self._counts:
+            scores, y_true = self.arrays(score, label, subset)
+            scores, y_true = scores[::-1], y_true[::-1]
+            last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+            tps = np.cumsum(y_true)[last]
+            self._counts[key] = (1 + last - tps, tps)
+        return self._counts[key]
@@ -0,0 +1,75 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+class ModelCache():
+    # Content-addressed store of fitted estimators (joblib) and their score
+    # columns (.npy, loaded memory-mapped). Entries are directories named by
+    # a key hash; the least recently used are evicted beyond max_bytes.
+    def __init__(self, directory, max_bytes = 2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok = True)
+
+    def key(self, *parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, (pd.DataFrame, pd.Series)):
+                digest.update(pd.util.hash_pandas_object(part, index = True).to_numpy().tobytes())
+                columns = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+                digest.update(repr(list(columns)).encode())
+            elif hasattr(part, 'get_params'):
+                params = sorted((name, type(value).__name__ if hasattr(value, 'get_params') else repr(value))
+                                for name, value in part.get_params(deep = True).items())
+                digest.update(repr((type(part).__module__, type(part).__qualname__, params)).encode())
+            else:
+                digest.update(repr(part).encode())
+        return digest.hexdigest()
+
+    def load(self, key, name):
+        path = self._path(key, name)
+        if not os.path.exists(path):
+            return None
+        os.utime(self._path(key))
+        if path.endswith('.npy'):
+            return np.load(path, mmap_mode = 'r')
+        import joblib
+        return joblib.load(path)
+
+    def save(self, key, name, value):
+        os.makedirs(self._path(key), exist_ok = True)
+        path = self._path(key, name)
+        handle, temporary = tempfile.mkstemp(dir = self._path(key), suffix = os.path.splitext(path)[1])
+        with os.fdopen(handle, 'wb') as f:
+            if path.endswith('.npy'):
+                np.save(f, np.asarray(value))
+            else:
+                import joblib
+                joblib.dump(value, f)
+        os.replace(temporary, path)
+        self.evict(keep = key)
+
+    def evict(self, keep = None):
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self._path(key)
+            if os.path.isdir(path):
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, key))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key != keep:
+                shutil.rmtree(self._path(key), ignore_errors = True)
+                total -= size
+
+    # name is 'model' for the estimator or 'scores_<hash>' for a score column
+    def _path(self, key, name = None):
+        if name is None:
+            return os.path.join(self.directory, key)
+        extension = '.npy' if name.startswith('scores') else '.joblib'
+        return os.path.join(self.directory, key, name + extension)
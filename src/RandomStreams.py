@@ -0,0 +1,23 @@
+import numpy as np
+
+class RandomStreams():
+    def __init__(self, seed = None):
+        if isinstance(seed, RandomStreams):
+            seed = seed.seed_sequence
+        elif isinstance(seed, np.random.Generator):
+            seed = seed.integers(2**63, size = 4)
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+
+    # The same key always maps to the same independent stream, so results do
+    # not depend on which thread or process draws it or in which order.
+    def seed_sequence_for(self, *key):
+        return np.random.SeedSequence(self.seed_sequence.entropy,
+            spawn_key = self.seed_sequence.spawn_key + tuple(int(k) for k in key))
+
+    def generator(self, *key):
+        return np.random.default_rng(self.seed_sequence_for(*key))
+
+    def spawn(self, *key):
+        return RandomStreams(self.seed_sequence_for(*key))
@@ -0,0 +1,197 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from src.ModelCache import ModelCache
+from src.ResultStore import ResultStore
+from src.DatasetStore import DatasetStore
+from src.SyntheticData import SyntheticData
+from src.SupervisedLearningModel import SupervisedLearningModel
+from src.MetricsEngine import MetricsEngine
+from src.MetricFrameGenerator import MetricFrameGenerator
+from src.EqualizedOddsPostProcesser import EqualizedOddsPostProcesser
+from src.EqualizedOddsPostProcessingAnalysis import EqualizedOddsPostProcessingAnalysis
+
+BLAS_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                  'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+class ReplicationExperiment():
+    def __init__(self, treatment_effect = 0.1, treatment_assignment_bias = 1.6,
+                 num_points = 100000, figure_directory = './replication', render = True,
+                 model_cache = None, cross_fit = None, store = None, data_store = None,
+                 inner_workers = None, reweighing_cache = None):
+        self.treatment_effect = treatment_effect
+        self.treatment_assignment_bias = treatment_assignment_bias
+        self.num_points = num_points
+        self.figure_directory = figure_directory
+        self.render = render
+        self.model_cache = ModelCache(model_cache) if isinstance(model_cache, str) else model_cache
+        self.cross_fit = cross_fit # number of folds for the propensity and counterfactual models
+        self.inner_workers = inner_workers # processes for the folds and reweighing sweep of one seed; None: one per CPU
+        self.store = ResultStore(store) if isinstance(store, str) else store # curve and table export
+        self.data_store = DatasetStore(data_store) if isinstance(data_store, str) else data_store
+        self.model_list = ['propensity', 'observational', 'counterfactual']
+        # the reweighing sweep does not depend on the replication seed; unless
+        # given, its points are memoized next to the stored results or datasets
+        if reweighing_cache is None:
+            stores = [store for store in [self.store, self.data_store] if store is not None]
+            reweighing_cache = os.path.join(stores[0].directory, 'reweighing') if stores else None
+        self.reweighing_cache = reweighing_cache
+
+    def run(self, seed):
+        from sklearn.model_selection import train_test_split
+        # scored data persisted by an earlier run with the same settings is
+        # memory-mapped instead of regenerated and refit
+        attrs = {'treatment_effect': self.treatment_effect, 'num_points': self.num_points,
+                 'treatment_assignment_bias': self.treatment_assignment_bias, 'cross_fit': self.cross_fit}
+        if self.data_store is not None and self.data_store.exists('synthetic', seed, attrs):
+            df = self.data_store.load('synthetic', seed)
+            config = self.data_store.manifest('synthetic', seed)['attrs']['config']
+        else:
+            synthetic_data = SyntheticData(
+                treatment_effect = self.treatment_effect,
+                treatment_assignment_bias = self.treatment_assignment_bias,
+                seed = seed)
+            df, config = synthetic_data.generate(num_points = self.num_points)
+            self._fit_models(df, config, seed)
+            if self.data_store is not None:
+                self.data_store.save('synthetic', seed, df, attrs = dict(attrs, config = config))
+        figures = self.render or self.store is not None
+        if self.store is not None:
+            self.store.save_config(config)
+
+        if figures:
+            reweighing_analysis = self._reweighing_analysis(config)
+            self._figure(seed, ('reweighing', 'fig'), reweighing_analysis,
+                         reweighing_analysis.base_rate_axis_labels(), reweighing_analysis.base_rate_panels())
+
+        ## Postprocess test and training datasets via equalized odds
+        metric_frame =  MetricFrameGenerator()
+        equalized_odds = EqualizedOddsPostProcesser(config)
+        observational = config['target']['observational']
+        sensitive = config['features']['sensitive']
+        _df, postprocessed = df[df.columns.difference(['treat', 'outcome'], sort=False)], {}
+        datasets = train_test_split(_df, test_size=0.3, random_state=0)
+        for key, raw_data in zip(['train', 'test'], datasets):
+            data = raw_data.copy()
+            if key == 'train':
+                metricframe = metric_frame.generate(data[observational], data['counterfactual'], data[sensitive])
+                train_metricframe = metricframe.copy()
+                mix_rates = equalized_odds.mix_rates(data, metricframe)
+            data['eo_fair_pred'] = equalized_odds.transform(
+                data['counterfactual'].to_numpy(), data[sensitive].to_numpy(), mix_rates)
+            postprocessed[key] = data
+            if self.data_store is not None:
+                self.data_store.save(key, seed, data.reset_index(), attrs = attrs)
+
+        eo_analysis = EqualizedOddsPostProcessingAnalysis(config, headless = True)
+        test_df = postprocessed['test']
+        if figures:
+            # one engine pass serves the post-processed ROC and the three metric figures
+            engine = MetricsEngine(config).fit(test_df, ['observational'] + eo_analysis.columns)
+            self._figure(seed, ('post_processed', 'fig_roc'), eo_analysis,
+                         eo_analysis.metrics, eo_analysis.roc_panels(test_df, engine))
+        errors = eo_analysis.error_analysis(test_df)
+        errors = errors[['Group', 'Method', 'cGFPR', 'cGFNR', 'oGFPR', 'oGFNR']]
+        if self.figure_directory:
+            with open(self._path('post_processed', 'fig_roc', seed, 'tex'), 'w') as f:
+                f.write(errors.to_latex(column_format='llrrrr', index=False))
+            np.save(self._path('post_processed', 'mix_rates', seed, 'npy'), mix_rates)
+
+        if figures:
+            from src.FairnessMetricVisualizer import FairnessMetricVisualizer
+            for metric in ['roc', 'precision_recall', 'calibration']:
+                visualizer = FairnessMetricVisualizer(metric = metric, parameters = config, headless = True)
+                self._figure(seed, (metric, 'fig'), visualizer,
+                             visualizer.axis_labels[metric], visualizer.metric_panels(test_df, engine))
+
+        tables = self._tables(errors, train_metricframe, mix_rates)
+        if self.store is not None:
+            for name, table in tables.items():
+                self.store.save_table(seed, name, table)
+        return self._tidy(seed, tables)
+
+    def run_seeds(self, seeds, max_workers = None, blas_threads = 1):
+        seeds = list(seeds)
+        if self.reweighing_cache and (self.render or self.store is not None):
+            # fill the shared sweep cache once so the seed workers only read it
+            _, config = next(SyntheticData(self.treatment_effect, self.treatment_assignment_bias).generate_chunks(1))
+            self._reweighing_analysis(config).reweighing.sweep()
+        with ProcessPoolExecutor(max_workers = max_workers, initializer = _init_seed_worker,
+                                 initargs = (blas_threads,)) as executor:
+            tables = list(executor.map(self.run, seeds))
+        results = pd.concat(tables, ignore_index = True)
+        return results, self.aggregate(results)
+
+    def aggregate(self, results):
+        summary = results.groupby(['table', 'Group', 'Method', 'metric'], sort = False)['value']
+        return summary.agg(['mean', 'std', 'count']).reset_index()
+
+    def _fit_models(self, df, config, seed):
+        from sklearn.linear_model import LogisticRegression
+        for model_key in self.model_list:
+            params = config.copy()
+            clf = LogisticRegression(penalty = 'none')
+            model = SupervisedLearningModel(model = clf, name = model_key, seed = seed, cache = self.model_cache)
+            if model_key == 'propensity':
+                params['target'] = params['treat']['name']
+            else:
+                params['target'] = params['outcome']['name']
+            if self.cross_fit and model_key != 'observational':
+                df[model_key] = model.cross_fit(df, params, n_splits = self.cross_fit,
+                                                n_jobs = self._inner_workers() or -1)
+            else:
+                model.fit(df, params)
+                model.predict_scores(df, column = model_key)
+
+    # figures are stored under their folder name and drawn to the matching png
+    def _figure(self, seed, name, visualizer, axis_labels, panels):
+        if self.store is not None:
+            self.store.save_curves(seed, name[0], visualizer, axis_labels, panels)
+        if self.render:
+            visualizer.render(axis_labels, panels, save = self._path(*name, seed, 'png'))
+
+    def _tables(self, errors, metricframe, mix_rates):
+        groups = ['A = {}'.format(a) for a in metricframe.index]
+        metricframe = metricframe.set_axis(groups, axis = 0).rename_axis('Group')
+        metricframe = metricframe.reset_index().assign(Method = 'Original')
+        mix_rates = pd.DataFrame(mix_rates, columns = ['p2p', 'n2p']).assign(Group = groups, Method = 'Post-Processed')
+        return {'error_analysis': errors, 'train_metrics': metricframe, 'mix_rates': mix_rates}
+
+    def _tidy(self, seed, tables):
+        tidy = [table.melt(id_vars = ['Group', 'Method'], var_name = 'metric').assign(table = name)
+                for name, table in tables.items()]
+        tidy = pd.concat(tidy, ignore_index = True).assign(seed = seed)
+        return tidy[['seed', 'table', 'Group', 'Method', 'metric', 'value']]
+
+    def _reweighing_analysis(self, config):
+        from src.ReweighingAnalysisVisualizer import ReweighingAnalysisVisualizer
+        return ReweighingAnalysisVisualizer(config, headless = True, max_workers = self._inner_workers(),
+                                            cache_dir = self.reweighing_cache)
+
+    # run_seeds workers already fill the CPUs, so nested pools run in-process
+    def _inner_workers(self):
+        return 1 if _IN_SEED_WORKER else self.inner_workers
+
+    def _path(self, folder, prefix, seed, extension):
+        return f"{self.figure_directory}/{folder}/{prefix}_seed_{str(seed).zfill(3)}.{extension}"
+
+_IN_SEED_WORKER = False
+
+def _init_seed_worker(blas_threads):
+    global _IN_SEED_WORKER
+    _IN_SEED_WORKER = True
+    _limit_blas_threads(blas_threads)
+
+def _limit_blas_threads(blas_threads):
+    if blas_threads is None:
+        return
+    for variable in BLAS_VARIABLES:
+        os.environ[variable] = str(blas_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    global _THREADPOOL_LIMITS
+    _THREADPOOL_LIMITS = threadpool_limits(limits = blas_threads)
@@ -0,0 +1,102 @@
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+
+class ResultStore():
+    # <directory>/config.json
+    # <directory>/curves/<figure>/seed_<seed>.npz   arrays '<panel>/<method>/{x,y,lower,upper}'
+    # <directory>/tables/<table>/seed_<seed>.parquet   (.csv when no parquet engine is installed)
+    def __init__(self, directory):
+        self.directory = directory
+
+    def save_config(self, config):
+        os.makedirs(self.directory, exist_ok = True)
+        with open(os.path.join(self.directory, 'config.json'), 'w') as f:
+            json.dump(config, f)
+
+    def load_config(self):
+        with open(os.path.join(self.directory, 'config.json')) as f:
+            return json.load(f)
+
+    # panels as passed to DataVisualizer.render: [title, (x, y, color, method[, (lower, upper)]), ...]
+    def save_curves(self, seed, figure, visualizer, axis_labels, panels):
+        arrays, layout = {}, []
+        for panel in panels:
+            title, lines = panel[0], panel[1:]
+            layout.append([title, [[line[3], line[2], len(line) > 4] for line in lines]])
+            for line in lines:
+                key = '{}/{}/'.format(title, line[3])
+                arrays[key + 'x'], arrays[key + 'y'] = np.asarray(line[0]), np.asarray(line[1])
+                if len(line) > 4:
+                    arrays[key + 'lower'], arrays[key + 'upper'] = map(np.asarray, line[4])
+        meta = {
+            'axis_labels': list(axis_labels),
+            'plt_type': visualizer.plt_type,
+            'legend_name': visualizer.legend_name,
+            'n_bins': getattr(visualizer, 'n_bins', None),
+            'panels': layout,
+        }
+        path = self._path('curves', figure, seed, 'npz')
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        np.savez(path, __meta__ = np.array(json.dumps(meta)), **arrays)
+
+    # returns (axis_labels, panels, meta) ready for DataVisualizer.render
+    def load_curves(self, figure, seed):
+        with np.load(self._path('curves', figure, seed, 'npz')) as data:
+            meta = json.loads(str(data['__meta__']))
+            panels = []
+            for title, lines in meta['panels']:
+                panel = [title]
+                for method, color, band in lines:
+                    key = '{}/{}/'.format(title, method)
+                    line = (data[key + 'x'], data[key + 'y'], color, method)
+                    panel.append(line + (((data[key + 'lower'], data[key + 'upper']),) if band else ()))
+                panels.append(panel)
+        return tuple(meta['axis_labels']), panels, meta
+
+    def save_table(self, seed, name, frame):
+        path = self._path('tables', name, seed, 'parquet')
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        try:
+            frame.to_parquet(path, index = False)
+        except ImportError:
+            frame.to_csv(path[:-len('parquet')] + 'csv', index = False)
+
+    def load_table(self, name, seed):
+        path = self._path('tables', name, seed, 'parquet')
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+        return pd.read_csv(path[:-len('parquet')] + 'csv')
+
+    # every stored seed of one table, stacked with a leading seed column
+    def table(self, name, seeds = None):
+        seeds = self.seeds('tables', name) if seeds is None else seeds
+        frames = [self.load_table(name, seed).assign(seed = seed) for seed in seeds]
+        frame = pd.concat(frames, ignore_index = True)
+        return frame[['seed'] + list(frame.columns[:-1])]
+
+    def seeds(self, kind, name):
+        files = glob.glob(os.path.join(self.directory, kind, name, 'seed_*.*'))
+        return sorted(set(int(os.path.basename(f).split('.')[0][len('seed_'):]) for f in files))
+
+    # redraws stored figures without recomputing them; save is a format
+    # string with a {seed} field, e.g. './replication/roc/fig_seed_{seed:03d}.png'
+    def render(self, figure, save, seeds = None, max_workers = None, visualizer = None):
+        from src.DataVisualizer import DataVisualizer
+        seeds = self.seeds('curves', figure) if seeds is None else seeds
+        jobs, meta = [], None
+        for seed in seeds:
+            axis_labels, panels, meta = self.load_curves(figure, seed)
+            jobs.append((axis_labels, panels, save.format(seed = seed)))
+        if meta is None:
+            return
+        if visualizer is None:
+            visualizer = DataVisualizer(plt_type = meta['plt_type'], legend_name = meta['legend_name'],
+                                        parameters = self.load_config(), n_bins = meta['n_bins'],
+                                        headless = True)
+        visualizer.render_many(jobs, max_workers = max_workers)
+
+    def _path(self, kind, name, seed, extension):
+        return os.path.join(self.directory, kind, name, 'seed_{}.{}'.format(str(seed).zfill(3), extension))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+class Reweighing():
+    # Kamiran & Calders reweighing: w(a, y) = P(A = a) P(Y = y) / P(A = a, Y = y),
+    # estimated from a k x m table of (sensitive, target) counts. The table
+    # can be accumulated chunk by chunk with partial_fit.
+    def __init__(self, sensitive, target):
+        self.sensitive = sensitive
+        self.target = target
+        self.sensitive_values = np.array([])
+        self.target_values = np.array([])
+        self.counts = np.zeros((0, 0))
+
+    def fit(self, df):
+        self.__init__(self.sensitive, self.target)
+        return self.partial_fit(df)
+
+    def partial_fit(self, df):
+        self._extend(df)
+        a, y = self._codes(df)
+        k, m = self.counts.shape
+        self.counts += np.bincount(a * m + y, minlength = k * m).reshape(k, m)
+        return self
+
+    def weights(self):
+        n = self.counts.sum()
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return np.outer(self.counts.sum(axis = 1), self.counts.sum(axis = 0)) / (n * self.counts)
+
+    # rows whose (sensitive, target) cell was never fitted get NaN
+    def transform(self, df):
+        table = np.vstack([np.c_[self.weights(), np.full(len(self.sensitive_values), np.nan)],
+                           np.full(len(self.target_values) + 1, np.nan)])
+        a, y = self._codes(df)
+        return table[a, y]
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    def _codes(self, df):
+        return (self._code(self.sensitive_values, df[self.sensitive].to_numpy()),
+                self._code(self.target_values, df[self.target].to_numpy()))
+
+    # position of each value in the sorted fitted values, -1 if unseen
+    def _code(self, values, column):
+        codes = np.searchsorted(values, column).clip(max = max(len(values) - 1, 0))
+        if len(values):
+            codes[values[codes] != column] = -1
+        else:
+            codes[:] = -1
+        return codes
+
+    def _extend(self, df):
+        sensitive_values = np.union1d(self.sensitive_values, pd.unique(df[self.sensitive]))
+        target_values = np.union1d(self.target_values, pd.unique(df[self.target]))
+        if len(sensitive_values) == len(self.sensitive_values) and len(target_values) == len(self.target_values):
+            return
+        counts = np.zeros((len(sensitive_values), len(target_values)))
+        counts[np.ix_(np.searchsorted(sensitive_values, self.sensitive_values),
+                      np.searchsorted(target_values, self.target_values))] = self.counts
+        self.sensitive_values, self.target_values, self.counts = sensitive_values, target_values, counts
@@ -4,13 +4,22 @@ from src.DataVisualizer import DataVisualizer
 from src.ReweighingExperiment import ReweighingExperiment
 
 class ReweighingAnalysisVisualizer(DataVisualizer):
-    def __init__(self, parameters):
+    # remaining keyword arguments (num_points, treatment_effect, seed,
+    # max_workers, cache_dir) configure the ReweighingExperiment sweep
+    def __init__(self, parameters, domain = np.linspace(0, 2, 5), headless = False, **kwargs):
         self.parameters = parameters
-        super().__init__(plt_type = 'reweighted', legend_name = 'Group', parameters = self.parameters)
-        self.domain, self.feature = np.linspace(0, 2, 5), 'base_rate'
-        self.reweighing = ReweighingExperiment(self.parameters, self.domain)
+        super().__init__(plt_type = 'reweighted', legend_name = 'Group', parameters = self.parameters,
+                         headless = headless)
+        self.domain, self.feature = domain, 'base_rate'
+        self.reweighing = ReweighingExperiment(self.parameters, self.domain, **kwargs)
 
     def visualize_base_rates(self, df, save = ''):
+        self.visualize(self.base_rate_axis_labels(), df, *self.base_rate_panels(), save=save)
+
+    def base_rate_axis_labels(self):
+        return ('Treatment Assignment Bias', self.feature.replace('_', ' ').title())
+
+    def base_rate_panels(self):
         results, plots = self.reweighing.summary(self.feature), []
         for (name, adj), result in results.items():
             plot = [' '.join([name, adj]).strip()]
@@ -19,5 +28,4 @@ class ReweighingAnalysisVisualizer(DataVisualizer):
                 label = 'A = {}'.format(i)
                 plot.append((self.domain,) + (arr, color, label))
             plots.append(plot)
-        y_label = self.feature.replace('_', ' ').title()
-        self.visualize(('Treatment Assignment Bias', y_label), df, *plots, save=save)
\ No newline at end of file
+        return plots
@@ -1,41 +1,83 @@
-import numpy as np
+import os
+import hashlib
+import pandas as pd
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
+from src.Reweighing import Reweighing
 from src.SyntheticData import SyntheticData
 from src.MetricFrameGenerator import MetricFrameGenerator
 
 class ReweighingExperiment():
-    def __init__(self, parameters, domain):
+    def __init__(self, parameters, domain, num_points = 100000, treatment_effect = 0.1,
+                 seed = 1, max_workers = None, cache_dir = None):
         self.domain = domain
         self.parameters = parameters
+        self.num_points = num_points
+        self.treatment_effect = treatment_effect
+        self.seed = seed
+        self.max_workers = max_workers # 1 runs the sweep in this process
+        self.cache_dir = cache_dir # memoizes each (bias, seed, size) point on disk
         self.sensitive = self.parameters['features']['sensitive']
         self.observational = self.parameters['target']['observational']
         self.names = ['', 'Reweighted']
-        self.columns = self.parameters['target'].values()
-        self.adjectives = self.parameters['target'].keys()
+        self.columns = list(self.parameters['target'].values())
+        self.adjectives = list(self.parameters['target'].keys())
 
     def summary(self, feature):
+        points = self.sweep()
         reweighed = defaultdict(list)
-        for t in self.domain: 
-            synthetic_data = SyntheticData(treatment_effect = 0.1, 
-                                        treatment_assignment_bias = t,
-                                        seed = 1)
-            __df, _ = synthetic_data.generate(num_points = 100000)
-            metric_frame =  MetricFrameGenerator()
-            weights = self._compute_weights(__df)
-            for (a, y), weight in np.ndenumerate(weights):
-                __df.loc[(__df[self.observational] == 1-y) & (__df[self.sensitive] == 1-a), 'weight'] = weight
-            weighted_metric_frame =  MetricFrameGenerator(weights = __df['weight'])
-
-            frames = [metric_frame, weighted_metric_frame]
-            for frame, name in zip(frames, self.names):
-                for col, adj in zip(self.columns, self.adjectives):
-                    reweighed[(name, adj)].append(frame.generate(
-                        __df[col], __df[col], __df[self.sensitive]).loc[:, feature])
+        for t in self.domain:
+            for key, metricframe in points[t].items():
+                reweighed[key].append(metricframe.loc[:, feature])
         return reweighed
 
-    def _compute_weights(self, __df):
-        criteria = [self.sensitive, self.observational]
-        counts = __df.groupby(criteria).count().iloc[:, 0].to_numpy()[::-1].reshape(2,2).astype(float)
-        A = np.outer(*np.c_[__df[criteria].mean(), (1 - __df[criteria].mean())])
-        return np.multiply(A, len(__df) * np.reciprocal(counts))
\ No newline at end of file
+    # {bias: {(name, adj): by_group metric frame}}, computing only the points
+    # missing from the cache
+    def sweep(self):
+        points = {t: self._load(t) for t in self.domain}
+        missing = [t for t, point in points.items() if point is None]
+        if self.max_workers == 1 or len(missing) < 2:
+            self._collect(points, missing, map(self._point, missing))
+        else:
+            with ProcessPoolExecutor(max_workers = self.max_workers) as executor:
+                self._collect(points, missing, executor.map(self._point, missing))
+        return points
+
+    def _collect(self, points, missing, computed):
+        for t, point in zip(missing, computed):
+            self._save(t, point)
+            points[t] = point
+
+    def _point(self, t):
+        synthetic_data = SyntheticData(treatment_effect = self.treatment_effect,
+                                       treatment_assignment_bias = t,
+                                       seed = self.seed)
+        __df, _ = synthetic_data.generate(num_points = self.num_points)
+        metric_frame =  MetricFrameGenerator()
+        __df['weight'] = Reweighing(self.sensitive, self.observational).fit_transform(__df)
+        weighted_metric_frame =  MetricFrameGenerator(weights = __df['weight'])
+
+        frames, point = [metric_frame, weighted_metric_frame], {}
+        for frame, name in zip(frames, self.names):
+            for col, adj in zip(self.columns, self.adjectives):
+                point[(name, adj)] = frame.generate(__df[col], __df[col], __df[self.sensitive])
+        return point
+
+    def _path(self, t):
+        key = repr((float(t), self.seed, self.num_points, float(self.treatment_effect),
+                    self.sensitive, self.observational, self.columns))
+        return os.path.join(self.cache_dir, 'reweighing_{}.pkl'.format(hashlib.sha1(key.encode()).hexdigest()))
+
+    def _load(self, t):
+        if self.cache_dir and os.path.exists(self._path(t)):
+            return pd.read_pickle(self._path(t))
+
+    def _save(self, t, point):
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            # seed workers may write the same point concurrently
+            path = self._path(t)
+            staging = '{}.{}.tmp'.format(path, os.getpid())
+            pd.to_pickle(point, staging)
+            os.replace(staging, path)
@@ -0,0 +1,99 @@
+import os
+import uuid
+import weakref
+import numpy as np
+import pandas as pd
+
+class SharedFrame():
+    # Numeric columns (or any dict of arrays) copied once into a single
+    # multiprocessing.shared_memory block. The descriptor - block name and
+    # (key, dtype, shape, offset) per array - is all that crosses a process
+    # boundary: pickling a SharedFrame sends the descriptor, and unpickling
+    # attaches read-only views, cached per process. The publishing process
+    # owns the block and unlinks it on close, on garbage collection or at
+    # exit; if it is killed, the multiprocessing resource tracker unlinks it.
+    _attached = {}
+
+    def __init__(self, block, descriptor, owner = False):
+        self.block = block
+        self.descriptor = descriptor
+        self.owner = owner
+        self.arrays = {}
+        for key, dtype, shape, offset in descriptor['arrays']:
+            array = np.ndarray(shape, dtype = np.dtype(dtype), buffer = block.buf, offset = offset)
+            array.flags.writeable = owner
+            self.arrays[key] = array
+        # forked workers inherit the publisher's frame but must not unlink it
+        self._finalizer = weakref.finalize(self, _release, block, os.getpid() if owner else None)
+
+    # data: DataFrame (numeric and boolean columns unless columns are given)
+    # or a dict of arrays
+    @classmethod
+    def publish(cls, data, columns = None):
+        from multiprocessing import shared_memory
+        if isinstance(data, pd.DataFrame):
+            if columns is None:
+                columns = [c for c in data.columns if data[c].dtype.kind in 'biuf']
+            data = {column: data[column].to_numpy() for column in columns}
+        arrays, layout, size = {}, [], 0
+        for key, values in data.items():
+            values = np.ascontiguousarray(values)
+            if values.dtype.kind not in 'biuf':
+                raise ValueError('Cannot share {} column {}'.format(values.dtype, key))
+            layout.append((key, values.dtype.str, values.shape, size))
+            arrays[key] = values
+            size += -(-values.nbytes // 64) * 64 # keep every array 64-byte aligned
+        name = 'sf_{}_{}'.format(os.getpid(), uuid.uuid4().hex[:12])
+        block = shared_memory.SharedMemory(name = name, create = True, size = max(size, 1))
+        shared = cls(block, {'name': name, 'arrays': layout}, owner = True)
+        for key, values in arrays.items():
+            shared.arrays[key][...] = values
+        cls._attached[name] = shared
+        return shared
+
+    # cheap after the first call in a process; attaching from the publisher
+    # returns its own frame
+    @classmethod
+    def attach(cls, descriptor):
+        shared = cls._attached.get(descriptor['name'])
+        if shared is None:
+            import multiprocessing
+            from multiprocessing import shared_memory, resource_tracker
+            block = shared_memory.SharedMemory(name = descriptor['name'])
+            # a process outside the publisher's tree has its own resource
+            # tracker, which would otherwise unlink the block when it exits
+            if multiprocessing.parent_process() is None:
+                resource_tracker.unregister(block._name, 'shared_memory')
+            shared = cls._attached[descriptor['name']] = cls(block, descriptor)
+        return shared
+
+    def __reduce__(self):
+        return (SharedFrame.attach, (self.descriptor,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # zero-copy over the one-dimensional arrays
+    def frame(self, columns = None):
+        columns = columns or [key for key, values in self.arrays.items() if values.ndim == 1]
+        return pd.DataFrame({column: self.arrays[column] for column in columns}, copy = False)
+
+    def close(self):
+        SharedFrame._attached.pop(self.descriptor['name'], None)
+        self.arrays = {}
+        self._finalizer()
+
+# unlinking first frees the block even while views of it are still alive
+def _release(block, owner):
+    if owner == os.getpid():
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+    try:
+        block.close()
+    except BufferError:
+        pass
@@ -1,24 +1,133 @@
-from sklearn.model_selection import train_test_split
+import numpy as np
+import pandas as pd
 
 class SupervisedLearningModel():
-    def __init__(self, model, name = 'observational', seed = None):
+    def __init__(self, model, name = 'observational', seed = None, cache = None):
         self.model = model
         self.name = name
         self.seed = seed
+        self.cache = cache # optional ModelCache
+        self.key = None
 
     def fit(self, df, parameters, sample_weight = None):
-        train, test = self._preprocess_data(df, parameters)
         features = parameters['features']['training']
         target = parameters['target']
         sample_weight = parameters['sample_weight']
+        self.features = features
+        if self.cache is not None:
+            columns = list(dict.fromkeys(features + [target, parameters['treat']['name']] +
+                                         [c for c in [sample_weight, parameters['is_train']] if c]))
+            self.key = self.cache.key(df[columns], self.model, self.name, self.seed,
+                                      features, target, sample_weight, parameters['is_train'])
+            model = self.cache.load(self.key, 'model')
+            if model is not None:
+                self.model = model
+                return self.model
+
+        train, test = self._preprocess_data(df, parameters)
         if sample_weight:
             self.model.fit(train[features], train[target], 
                            sample_weight = train[sample_weight])
         else:
             self.model.fit(train[features], train[target])
+        if self.cache is not None:
+            self.cache.save(self.key, 'model', self.model)
         return self.model
 
+    # column, if given, receives the scores in df
+    def predict_scores(self, df, chunk_size = None, column = None):
+        if self.key is not None:
+            name = 'scores_' + self.cache.key(df[self.features])
+            scores = self.cache.load(self.key, name)
+        if self.key is None or scores is None:
+            scores = self._scores(self.model, df, chunk_size, columns = self.features)
+            if self.key is not None:
+                self.cache.save(self.key, name, scores)
+        if column is not None:
+            df[column] = scores
+        return scores
+
+    # Out-of-fold scores: each fold is scored by a clone fit on the other
+    # folds (restricted to the control group for the counterfactual model),
+    # with the folds fit in parallel by joblib (n_jobs = -1: one per CPU).
+    def cross_fit(self, df, parameters, n_splits = 5, n_jobs = -1):
+        from joblib import Parallel, delayed
+        from sklearn.model_selection import KFold
+
+        features = parameters['features']['training']
+        target = parameters['target']
+        sample_weight = parameters['sample_weight']
+        self.features = features
+        if self.cache is not None:
+            columns = list(dict.fromkeys(features + [target, parameters['treat']['name']] +
+                                         [c for c in [sample_weight] if c]))
+            key = self.cache.key(df[columns], self.model, self.name, self.seed,
+                                 features, target, sample_weight, 'cross_fit', n_splits)
+            scores = self.cache.load(key, 'scores_out_of_fold')
+            if scores is not None:
+                return scores
+
+        X = df[features].to_numpy()
+        y = df[target].to_numpy()
+        weights = df[sample_weight].to_numpy() if sample_weight else None
+        eligible = np.ones(len(df), dtype = bool)
+        if self.name == 'counterfactual':
+            eligible = df[parameters['treat']['name']].to_numpy() == 0
+
+        folds = list(KFold(n_splits = n_splits, shuffle = True, random_state = self.seed).split(X))
+        fold_scores = Parallel(n_jobs = n_jobs)(
+            delayed(self._fit_fold)(X, y, weights, train[eligible[train]], test) for train, test in folds)
+        scores = np.empty(len(df))
+        for (_, test), fold in zip(folds, fold_scores):
+            scores[test] = fold
+        if self.cache is not None:
+            self.cache.save(key, 'scores_out_of_fold', scores)
+        return scores
+
+    def _fit_fold(self, X, y, weights, train, test):
+        from sklearn.base import clone
+        model = clone(self.model)
+        if weights is not None:
+            model.fit(X[train], y[train], sample_weight = weights[train])
+        else:
+            model.fit(X[train], y[train])
+        return self._scores(model, X[test])
+
+    # Propensity scores are P(treated); outcome models score the first class
+    # ('harm' for the synthetic outcome). Chunks are written straight into
+    # one output array: logistic models via X @ coef + intercept and an
+    # in-place sigmoid, others via predict_proba. X is an array or a frame
+    # whose columns are read one chunk of rows at a time, so only
+    # chunk_size x len(columns) features are materialized at once.
+    def _scores(self, model, X, chunk_size = 2**16, columns = None):
+        from sklearn.linear_model import LogisticRegression
+        scores = np.empty(len(X))
+        chunk_size = chunk_size or 2**16
+        column = 1 if self.name == 'propensity' else 0
+        linear = isinstance(model, LogisticRegression) and len(model.classes_) == 2
+        for start in range(0, len(X), chunk_size):
+            out = scores[start:start + chunk_size]
+            if isinstance(X, pd.DataFrame):
+                chunk = X.iloc[start:start + chunk_size][columns].to_numpy(dtype = np.float64)
+            else:
+                chunk = X[start:start + chunk_size]
+            if linear:
+                np.dot(chunk, model.coef_[0], out = out)
+                out += model.intercept_[0]
+                if column == 1:
+                    np.negative(out, out = out)
+                with np.errstate(over = 'ignore'):
+                    np.exp(out, out = out)
+                out += 1
+                np.reciprocal(out, out = out)
+            else:
+                if hasattr(model, 'feature_names_in_'):
+                    chunk = pd.DataFrame(chunk, columns = model.feature_names_in_, copy = False)
+                out[:] = model.predict_proba(chunk)[:, column]
+        return scores
+
     def _preprocess_data(self, df, parameters):
+        from sklearn.model_selection import train_test_split
         if parameters['is_train']:
             (_, test), (_, train) = tuple(df.groupby(parameters['is_train']))
         else:
@@ -27,4 +136,4 @@ class SupervisedLearningModel():
             treat_dict = parameters['treat']
             train = train[train[treat_dict['name']] == 0]
             test = test[test[treat_dict['name']] == 0]
-        return train, test
\ No newline at end of file
+        return train, test
@@ -1,17 +1,65 @@
 import numpy as np
 import pandas as pd
 
+from src.RandomStreams import RandomStreams
+
 class SyntheticData():
+    # rows drawn from each independent stream in generate_chunks; chunks are
+    # cut from these blocks so results do not depend on the chunk size
+    block_size = 2**16
+
+    # seed may be an int, a SeedSequence or a Generator; every (block, column)
+    # draws from its own child stream and no global RNG state is touched
     def __init__(self, treatment_effect, treatment_assignment_bias, seed = None):
         self.seed = seed
-        np.random.seed(self.seed)
+        self.streams = RandomStreams(seed)
         self.treatment_effect = treatment_effect
         self.treatment_assignment_bias = treatment_assignment_bias
 
     def generate(self, num_points, treatment_as_feature = False):
+        chunks = self.generate_chunks(num_points, chunk_size = max(num_points, 1),
+                                      treatment_as_feature = treatment_as_feature)
+        # same rows as generate_chunks, with the original int64/str dtypes
+        df, config = next(chunks)
+        binary = [self.columns[key] for key in ['sensitive_feature', 'treatment', 'observational_response',
+                                                'counterfactual_response', 'alternative_response']]
+        df = df.astype(dict.fromkeys(binary, np.int64))
+        df[self.columns['outcome']] = np.where(df[self.columns['observational_response']] == 1, 'harm', 'ok')
+        return df, config
 
-        np.random.seed(self.seed)
+    def generate_chunks(self, num_points, chunk_size = 10**6, treatment_as_feature = False,
+                        dtype = np.float64):
+        self._configure(treatment_as_feature)
+        cached = (None, None)
+        for start in range(0, num_points, chunk_size):
+            stop = min(start + chunk_size, num_points)
+            first, last = start // self.block_size, (stop - 1) // self.block_size
+            blocks = []
+            for block in range(first, last + 1):
+                if cached[0] != block:
+                    cached = (block, self._block(block, num_points, dtype))
+                blocks.append(cached[1])
+            offset = first * self.block_size
+            columns = [np.concatenate(column)[start - offset:stop - offset] for column in zip(*blocks)]
+            Z, A, T, Y, Y_0, Y_1 = columns
+            outcome = pd.Categorical.from_codes(Y, categories = ['ok', 'harm'])
+            df = self._frame(Z, A, T, Y, Y_0, Y_1, outcome)
+            df.index = pd.RangeIndex(start, stop)
+            yield df, self.config
 
+    def _block(self, block, num_points, dtype):
+        Z_rng, A_rng, Y_0_rng, Y_1_rng, T_rng = [self.streams.generator(block, column) for column in range(5)]
+        size = min(self.block_size, num_points - block * self.block_size)
+        Z = Z_rng.normal(loc = 0, scale = 1, size = size)
+        A = A_rng.binomial(n = 1, p = 0.5, size = size).astype(np.int8)
+        Y_0 = Y_0_rng.binomial(n = 1, p = self._sigmoid(Z - 0.5)).astype(np.int8)
+        Y_1 = Y_1_rng.binomial(n = 1, p = self.treatment_effect * self._sigmoid(Z - 0.5)).astype(np.int8)
+        T = T_rng.binomial(n = 1, p = self._sigmoid(Z - 0.5 +
+            self.treatment_assignment_bias*A)).astype(np.int8)
+        Y = T*Y_1 + (1-T)*Y_0
+        return Z.astype(dtype, copy = False), A, T, Y, Y_0, Y_1
+
+    def _configure(self, treatment_as_feature):
         self.columns = {
             'treatment': 'treat_num',
             'outcome': 'outcome',
@@ -22,18 +70,9 @@ class SyntheticData():
             'alternative_response': 'Y_1'
         }
 
-        Z = np.random.normal(loc = 0, scale = 1, size = num_points)
-        A = np.random.binomial(n = 1, p = 0.5, size = num_points)
-        Y_0 = np.random.binomial(n = 1, p = self._sigmoid(Z - 0.5))
-        Y_1 = np.random.binomial(n = 1, p = self.treatment_effect * self._sigmoid(Z - 0.5))
-        T = np.random.binomial(n = 1, p = self._sigmoid(Z - 0.5 +
-            self.treatment_assignment_bias*A))
-        Y = T*Y_1 + (1-T)*Y_0
-
-
         self.config = {
             'treat': {
-                'name': self.columns['treatment'], # column name of treatment data 
+                'name': self.columns['treatment'], # column name of treatment data
                 ## control group = 0
             },
             'outcome': {
@@ -42,7 +81,7 @@ class SyntheticData():
             'features': {
                 'training': list(set(self.columns['features']) - set([self.columns['treatment'] if not treatment_as_feature else ''])),
                 'sensitive': self.columns['sensitive_feature'],
-            }, 
+            },
             # response variable for training model
             'is_train': False, # identifier that determines if row is part of training data
             'sample_weight': None # presence of sample weights
@@ -53,18 +92,17 @@ class SyntheticData():
             'counterfactual': self.columns['counterfactual_response'],
         }
 
+    def _frame(self, Z, A, T, Y, Y_0, Y_1, outcome):
         synthetic_data = dict(zip(self.columns['features'], [Z, A, T]))
         synthetic_data.update(
             {
                 self.columns['observational_response']: Y,
                 self.columns['alternative_response']: Y_1,
                 self.columns['counterfactual_response']: Y_0,
-                self.columns['outcome']: np.where(Y == 1, 'harm', 'ok'),
+                self.columns['outcome']: outcome,
             }
         )
-
-        df = pd.DataFrame(data=synthetic_data)
-        return df, self.config
+        return pd.DataFrame(data=synthetic_data)
 
     def _sigmoid(self, z):
-        return np.reciprocal(1 + np.exp(-z))
\ No newline at end of file
+        return np.reciprocal(1 + np.exp(-z))